@@ -1,21 +1,24 @@
 import pytz
-import yaml
 import json
-import asyncio
 import logging
 import pandas as pd
 import streamlit as st
 import streamlit_authenticator as stauth
 
 from enum import Enum
-from bson import ObjectId
 from datetime import datetime
-from utils.models import Movement, MovementType
-from utils.database import get_collection
-from utils.utils import get_model, get_sources, validate_or_add_category, update_source_balance, insert_movement
-
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
+from utils.models import Movement, MovementType, SourceType
+from utils.migrations import get_database, ensure_indexes
+from utils.users import UserCredentials, get_auth_settings, get_users_collection, save_user
+from utils.runtime import run_async
+from utils.telemetry import span, start_metrics_server
+from utils.streaming import stream_movements
+from utils.fast_parser import parse_movements, get_fast_parser_stats
+from utils.llm_cache import get_cached_movements, set_cached_movements, get_cache_stats
+from utils.utils import (get_model, get_output_parser, get_prompt_template, get_prompt_sources,
+                         get_user_resources, invalidate_user_resources, accept_movements)
+
+from pydantic import ValidationError
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
@@ -38,47 +41,41 @@ class AuthOptions(Enum):
     SIGN_IN = "Sign In"
     SIGN_UP = "Sign Up"
 
-def load_authenticator():
+@st.cache_resource
+def bootstrap_database():
     try:
-        config_collection = get_collection(
-            st.secrets.db_credentials.uri,
-            st.secrets.db_credentials.database_name,
-            st.secrets.db_collections.config_collection_name
-        )
+        ensure_indexes(get_database())
+    except Exception as e:
+        logging.error(f"Error bootstrapping the database indexes: {e}")
 
-        document = config_collection.find_one({"_id": ObjectId(st.secrets.config.config_id_from_db)})
+def load_authenticator():
+    try:
+        auth_settings = get_auth_settings()
 
-        if document:
-            del document["_id"]
-            yaml_config = yaml.dump(document, default_flow_style=False)
-            st.session_state.authenticator_config = yaml.safe_load(yaml_config)
+        if auth_settings:
+            credentials = {"usernames": {}}
 
             st.session_state.authenticator = stauth.Authenticate(
-                st.session_state.authenticator_config['credentials'],
-                st.session_state.authenticator_config['cookie']['name'],
-                st.session_state.authenticator_config['cookie']['key'],
-                st.session_state.authenticator_config['cookie']['expiry_days']
+                credentials,
+                auth_settings['cookie']['name'],
+                auth_settings['cookie']['key'],
+                auth_settings['cookie']['expiry_days'],
+                auto_hash=False
             )
+
+            # The authenticator rebuilds the usernames dict on init, users are swapped in lazily afterwards
+            credentials["usernames"] = UserCredentials(get_users_collection())
+
+            st.session_state.authenticator_config = {**auth_settings, "credentials": credentials}
         else:
             logging.info("Auth config not found!")
     except Exception as e:
         st.error(f"Error loading the auth configuration: {e}")
 
 def update_authenticator():
-    try:
-        config_collection = get_collection(
-            st.secrets.db_credentials.uri,
-            st.secrets.db_credentials.database_name,
-            st.secrets.db_collections.config_collection_name
-        )
-
-        config_collection.update_one(
-            {"_id": ObjectId(st.secrets.config.config_id_from_db)},
-            {"$set": st.session_state.authenticator_config}
-        )
-    except Exception as e:
-        st.error(f"Error updating the current auth data: {e}")
-        logging.error(f"Error updating the current auth data: {e}")
+    username = st.session_state.username
+
+    save_user(username, st.session_state.authenticator_config["credentials"]["usernames"][username])
 
 def sign_in():
     st.session_state.authenticator.experimental_guest_login(
@@ -97,37 +94,69 @@ def sign_in():
 def load_profile_data():
     st.session_state.profile_data = st.session_state.authenticator_config["credentials"]["usernames"][st.session_state.username]
 
+def finalize_movement(movement: Movement) -> Movement:
+    if movement.datetime is None:
+        movement.datetime = datetime.now(tz=pytz.timezone('America/Mexico_City')).strftime("%Y-%m-%d %H:%M:%S")
+
+    if movement.movement_type == MovementType.INCOME:
+        movement.category = MovementType.INCOME
+
+    return movement
+
 def display_message(message, chat_window):
     if message["user"] == "Finbot":
         with st.chat_message(message["user"], avatar=message["profile_picture"]):
-            if message["message"] is not None:
-                st.write(message["message"]["description"])
+            if message["message"]:
+                for movement_data in message["message"]:
+                    st.write(movement_data["description"])
 
-                response_df = pd.DataFrame(message["message"], index=[0])
+                response_df = pd.DataFrame(message["message"])
 
-                st.dataframe(
+                edited_df = st.data_editor(
                     response_df.drop(columns=["description"]),
                     column_config= {
                         "datetime": "📅 Fecha y hora",
                         "name": "👤 Movimiento",
-                        "movement_type": "🔘 Tipo",
-                        "source": "💳 Fuente",
+                        "movement_type": st.column_config.SelectboxColumn(
+                            "🔘 Tipo",
+                            options=[movement_type.value for movement_type in MovementType],
+                            required=True
+                        ),
+                        "source_name": "💳 Fuente",
+                        "source_type": st.column_config.SelectboxColumn(
+                            "🌀 Tipo de fuente",
+                            options=[source_type.value for source_type in SourceType],
+                            required=True
+                        ),
                         "category": "🏷️ Categoría",
-                        "amount": "💲 Cantidad"
+                        "amount": st.column_config.NumberColumn("💲 Cantidad", min_value=0.0, required=True)
                     },
-                    hide_index=True
+                    hide_index=True,
+                    num_rows="dynamic",
+                    disabled=st.session_state.movement_accepted,
+                    key=f"movements_editor_{message['timestamp']}"
                 )
 
                 if not st.session_state.movement_accepted:
                     if st.button("Accept", icon="👍"):
-                        movement = Movement(**message["message"])
-                        movement = asyncio.run(validate_or_add_category(movement, st.session_state.username))
-
-                        asyncio.run(insert_movement(movement, st.session_state.username))
-                        asyncio.run(update_source_balance(movement, st.session_state.username))
-
-                        st.toast("Movement accepted!", icon="👍")
-                        st.session_state.movement_accepted = True
+                        edited_df["description"] = response_df["description"].reindex(edited_df.index).fillna("")
+                        edited_df["datetime"]    = edited_df["datetime"].where(edited_df["datetime"].notna(), None)
+
+                        try:
+                            movements = [
+                                finalize_movement(Movement(**movement_data))
+                                for movement_data in edited_df.to_dict(orient="records")
+                            ]
+                        except ValidationError as e:
+                            movements = []
+                            st.error(f"Please review the movements: {e}")
+
+                        if movements and run_async(accept_movements(movements, st.session_state.username)):
+                            st.toast(f"{len(movements)} movements accepted!", icon="👍")
+                            st.session_state.movement_accepted = True
+                            invalidate_user_resources()
+                        elif movements:
+                            st.error("Error processing the movements")
             else:
                 st.write("Sorry, I can't help you with that.")
     else:
@@ -136,15 +165,7 @@ def display_message(message, chat_window):
 def show_chat_window():
     chat_window = st.container()
 
-    model        = get_model()
-    parser       = PydanticOutputParser(pydantic_object=Movement)
-    user_sources = asyncio.run(get_sources(st.session_state.username))
-
-    prompt_template = PromptTemplate(
-        template="Answer the user query. Identify the money source according to the user sources: {user_sources}\n{format_instructions}\n{query}\n",
-        input_variables=["query"],
-        partial_variables={"format_instructions": parser.get_format_instructions(), "user_sources": user_sources},
-    )
+    user_sources, user_categories = get_user_resources(st.session_state.username)
 
     if prompt := st.chat_input("Di algo..."):
         st.session_state.user_input = {
@@ -156,41 +177,58 @@ def show_chat_window():
         
         st.session_state.movement_accepted = False
 
+    cache_stats  = get_cache_stats()
+    parser_stats = get_fast_parser_stats()
+    st.caption(
+        f"⚡ Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses · "
+        f"Local parser coverage: {parser_stats['coverage']:.0%} of {parser_stats['attempts']} prompts"
+    )
+
     if st.session_state.user_input is not None:
         display_message(st.session_state.user_input, chat_window)
 
         if st.session_state.model_output is None:
             with chat_window:
                 with st.spinner("Finbot is typing..."):
-                    prompt_and_model = prompt_template | model
+                    with span("chat.respond"):
+                        query     = st.session_state.user_input["message"]
+                        movements = parse_movements(query, user_sources, user_categories)
 
-                    output = prompt_and_model.invoke({"query": prompt})
-                    
-                    if asyncio.iscoroutine(output):
-                        output = asyncio.run(output)
+                        if movements is not None:
+                            movements_data = [json.loads(movement.model_dump_json()) for movement in movements]
+                        else:
+                            movements_data = get_cached_movements(query, user_sources)
 
-                    movement_data = parser.invoke(output)
+                        if isinstance(movements_data, dict):
+                            movements_data = [movements_data]
 
-                    if isinstance(movement_data, list):
-                        movement_data = movement_data[0]
+                        if movements_data is None:
+                            parser           = get_output_parser()
+                            prompt_and_model = get_prompt_template() | get_model()
+                            preview          = st.empty()
 
-                    if not isinstance(movement_data, dict):
-                        movement_data = movement_data.model_dump()
+                            movements, output = stream_movements(
+                                prompt_and_model,
+                                {"query": query, "user_sources": get_prompt_sources(user_sources)},
+                                on_partial=lambda partial: preview.dataframe(pd.DataFrame(partial), hide_index=True)
+                            )
 
-                    movement = Movement(**movement_data)
+                            if movements is None:
+                                with span("chat.output_parser"):
+                                    movements = parser.invoke(output).movements
 
-                    if movement.datetime is None:
-                        movement.datetime = datetime.now(tz=pytz.timezone('America/Mexico_City')).strftime("%Y-%m-%d %H:%M:%S")
+                            movements_data = [json.loads(movement.model_dump_json()) for movement in movements]
 
-                    if movement.movement_type == MovementType.INCOME:
-                        movement.category = MovementType.INCOME
+                            set_cached_movements(query, user_sources, movements_data)
 
-                    st.session_state.model_output = {
-                        "user": "Finbot",
-                        "message": json.loads(movement.model_dump_json()),
-                        "profile_picture": "https://github.com/Raf-rgb/finbot/blob/main/app/assets/assistant_picture.png?raw=true",
-                        "timestamp": datetime.now().isoformat()
-                    }
+                        movements = [finalize_movement(Movement(**movement_data)) for movement_data in movements_data]
+
+                        st.session_state.model_output = {
+                            "user": "Finbot",
+                            "message": [json.loads(movement.model_dump_json()) for movement in movements],
+                            "profile_picture": "https://github.com/Raf-rgb/finbot/blob/main/app/assets/assistant_picture.png?raw=true",
+                            "timestamp": datetime.now().isoformat()
+                        }
 
                     st.rerun()
         else:
@@ -221,6 +259,9 @@ def show_chat_page():
     show_chat_window()
 
 def main():
+    bootstrap_database()
+    start_metrics_server()
+
     if st.session_state.authenticator is None:
         load_authenticator()
         
@@ -0,0 +1,112 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from datetime import datetime, timedelta
+from utils.models import MovementType, SourceType
+from utils.rollups import ROLLUP_KEY_FIELDS
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+DEFAULT_SEED    = 42
+DEFAULT_DAYS    = 730
+INCOME_RATIO    = 0.15
+SEED_BATCH_SIZE = 50000
+
+CATEGORY_NAMES = [
+    "COMIDA", "TRANSPORTE", "SUPERMERCADO", "RENTA", "SERVICIOS", "SALUD", "ENTRETENIMIENTO", "ROPA",
+    "EDUCACION", "VIAJES", "MASCOTAS", "REGALOS", "SUSCRIPCIONES", "GASOLINA", "HOGAR", "OTROS"
+]
+
+def get_usernames(users: int) -> list:
+    return [f"user_{index:03d}" for index in range(users)]
+
+def get_category_names(categories: int) -> list:
+    names = CATEGORY_NAMES[:categories]
+
+    return names + [f"CATEGORIA_{index:03d}" for index in range(len(names), categories)]
+
+def generate_sources(usernames: list, sources: int, seed: int = DEFAULT_SEED) -> list:
+    rng          = np.random.default_rng(seed)
+    source_types = [source_type.value for source_type in SourceType]
+
+    return [
+        {
+            "username": username,
+            "source_name": f"FUENTE_{index:02d}",
+            "source_type": source_types[index % len(source_types)],
+            "last_digits": f"{rng.integers(0, 10000):04d}",
+            "source_balance": round(float(rng.uniform(1000, 50000)), 2)
+        }
+        for username in usernames
+        for index in range(sources)
+    ]
+
+def generate_movements(rows: int, users: int = 1, sources: int = 3, categories: int = 12,
+                       seed: int = DEFAULT_SEED, end: datetime = None, days: int = DEFAULT_DAYS) -> pd.DataFrame:
+    rng       = np.random.default_rng(seed)
+    end       = end or datetime.now().replace(microsecond=0)
+    usernames = np.array(get_usernames(users))
+    names     = np.array(get_category_names(categories))
+
+    user_index   = rng.integers(0, users, rows)
+    source_index = rng.integers(0, sources, rows)
+    is_income    = rng.random(rows) < INCOME_RATIO
+    seconds      = rng.integers(0, days * 24 * 3600, rows)
+    amounts      = np.where(is_income, rng.lognormal(9.0, 0.5, rows), rng.lognormal(5.5, 1.0, rows)).round(2)
+    category     = np.where(is_income, MovementType.INCOME.value.upper(), names[rng.integers(0, categories, rows)])
+    source_types = np.array([source_type.value for source_type in SourceType])
+
+    movements = pd.DataFrame(
+        {
+            "username": usernames[user_index],
+            "datetime": pd.Timestamp(end) - pd.to_timedelta(seconds, unit="s"),
+            "name": np.char.capitalize(category.astype(str)),
+            "description": "Movimiento sintetico",
+            "movement_type": np.where(is_income, MovementType.INCOME.value, MovementType.EXPENSE.value),
+            "amount": amounts,
+            "source_name": np.char.add("FUENTE_", np.char.zfill(source_index.astype(str), 2)),
+            "source_type": source_types[source_index % len(source_types)],
+            "category": category
+        }
+    )
+
+    return movements.sort_values("datetime", ignore_index=True)
+
+def get_rollup_documents(movements: pd.DataFrame) -> list:
+    grouped = (
+        movements.assign(year=movements["datetime"].dt.year, month=movements["datetime"].dt.month)
+                 .groupby(ROLLUP_KEY_FIELDS)["amount"]
+                 .agg(amount="sum", count="count")
+                 .reset_index()
+    )
+
+    return grouped.to_dict(orient="records")
+
+def seed_database(database, collection_names: dict, movements: pd.DataFrame, sources: list, categories: list,
+                  batch_size: int = SEED_BATCH_SIZE):
+    finance_collection = database[collection_names["finance"]]
+
+    for start in range(0, len(movements), batch_size):
+        batch = movements.iloc[start:start + batch_size]
+        finance_collection.insert_many(
+            [
+                {**document, "datetime": document["datetime"].to_pydatetime()}
+                for document in batch.to_dict(orient="records")
+            ],
+            ordered=False
+        )
+
+    if sources:
+        database[collection_names["sources"]].insert_many([dict(source) for source in sources])
+
+    database[collection_names["categories"]].insert_many(
+        [{"username": username, "categories": list(categories)} for username in movements["username"].unique()]
+    )
+
+    rollups = get_rollup_documents(movements)
+
+    if rollups:
+        database[collection_names["rollups"]].insert_many(rollups)
+
+    logging.info(f"Seeded {len(movements)} movements for {movements['username'].nunique()} users")
@@ -0,0 +1,233 @@
+import sys
+import json
+import time
+import inspect
+import functools
+import logging
+import argparse
+import platform
+import statistics
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime
+from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from utils.migrations import INDEXES
+from benchmarks.scenarios import get_scenarios, get_benchmark_frame
+from benchmarks.generator import DEFAULT_SEED, generate_movements, generate_sources, get_category_names, get_usernames, seed_database
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+BENCHMARK_DATABASE = "finbot_benchmark"
+DEFAULT_BASELINE   = Path(__file__).with_name("baseline.json")
+DEFAULT_TOLERANCE  = 0.2
+
+COLLECTION_NAMES = {
+    "finance": "finance",
+    "sources": "sources",
+    "categories": "categories",
+    "rollups": "rollups",
+    "checkpoints": "source_checkpoints"
+}
+
+INDEX_COLLECTIONS = {
+    "finance_collection_name": "finance",
+    "sources_collection_name": "sources",
+    "categories_collection_name": "categories",
+    "rollups_collection_name": "rollups",
+    "checkpoints_collection_name": "checkpoints"
+}
+
+def patch_memory_bulk_updates(mongomock):
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    if "sort" in inspect.signature(add_update).parameters:
+        return
+
+    # pymongo 4.11+ always passes sort to the bulk builder, mongomock has no such argument
+    @functools.wraps(add_update)
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        if sort is not None:
+            raise NotImplementedError("The memory backend cannot sort bulk updates")
+
+        return add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+def get_clients(backend: str, uri: str) -> tuple:
+    if backend == "mongod":
+        return MongoClient(uri), AsyncIOMotorClient(uri)
+
+    try:
+        import mongomock
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError as e:
+        raise SystemExit(f"The memory backend needs mongomock and mongomock-motor installed: {e}")
+
+    patch_memory_bulk_updates(mongomock)
+
+    client = mongomock.MongoClient()
+
+    # Both clients have to share one in-memory store to see the same documents
+    return client, AsyncMongoMockClient(mongo_client=client)
+
+def create_indexes(database):
+    for collection_key, collection_name in INDEX_COLLECTIONS.items():
+        for index in INDEXES.get(collection_key, []):
+            database[COLLECTION_NAMES[collection_name]].create_index(index["keys"], unique=index.get("unique", False), **index.get("options", {}))
+
+def time_scenario(function, context: dict, repeat: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        function(context)
+
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(context)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings)
+    }
+
+def compare_results(results: dict, baseline: dict, tolerance: float) -> dict:
+    comparison = {}
+
+    for name, result in results.items():
+        baseline_result = baseline.get("results", {}).get(name)
+
+        if not baseline_result or "median" not in baseline_result or "median" not in result:
+            continue
+
+        ratio = result["median"] / baseline_result["median"] if baseline_result["median"] else float("inf")
+
+        comparison[name] = {
+            "baseline": baseline_result["median"],
+            "current": result["median"],
+            "ratio": ratio,
+            "regression": ratio > 1 + tolerance
+        }
+
+    return comparison
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Time the plotter, History and accept paths over a synthetic ledger")
+    parser.add_argument("--rows", type=int, default=10000, help="Synthetic movements to generate (10k to 5M)")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--sources", type=int, default=3, help="Sources per user")
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--backend", choices=["memory", "mongod"], default="memory")
+    parser.add_argument("--uri", default="mongodb://localhost:27017", help="Used by the mongod backend")
+    parser.add_argument("--scenarios", nargs="*", help="Scenario name prefixes to run, e.g. plotter history.paginate")
+    parser.add_argument("--output", type=Path, help="Also write the results JSON to this file")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed median slowdown before flagging")
+    parser.add_argument("--keep", action="store_true", help="Keep the mongod benchmark database after the run")
+
+    return parser
+
+def main(args) -> int:
+    client, async_client = get_clients(args.backend, args.uri)
+
+    client.drop_database(BENCHMARK_DATABASE)
+
+    database       = client[BENCHMARK_DATABASE]
+    async_database = async_client[BENCHMARK_DATABASE]
+    usernames      = get_usernames(args.users)
+    categories     = get_category_names(args.categories)
+    sources        = generate_sources(usernames, args.sources, args.seed)
+    now            = datetime.now().replace(microsecond=0)
+
+    seed_start = time.perf_counter()
+    movements  = generate_movements(args.rows, args.users, args.sources, args.categories, args.seed, now)
+
+    create_indexes(database)
+    seed_database(database, COLLECTION_NAMES, movements, sources, categories)
+
+    seed_seconds = time.perf_counter() - seed_start
+
+    context = {
+        "now": now,
+        "username": usernames[0],
+        "category": categories[0],
+        "source": sources[0],
+        "frame": get_benchmark_frame(movements, usernames[0]),
+        "finance_collection": database[COLLECTION_NAMES["finance"]],
+        "async_collections": {key: async_database[name] for key, name in COLLECTION_NAMES.items()},
+        "rng": np.random.default_rng(args.seed)
+    }
+
+    del movements
+
+    results = {}
+
+    for name, function in get_scenarios(args.scenarios).items():
+        try:
+            results[name] = time_scenario(function, context, args.repeat, args.warmup)
+        except Exception as e:
+            logging.error(f"Benchmark scenario {name} failed: {e}")
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    report = {
+        "metadata": {
+            "backend": args.backend,
+            "rows": args.rows,
+            "users": args.users,
+            "sources": args.sources,
+            "categories": args.categories,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "frame_rows": len(context["frame"]),
+            "seed_seconds": seed_seconds,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "created_at": now.isoformat()
+        },
+        "results": results
+    }
+
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+
+        if {key: baseline["metadata"].get(key) for key in ["backend", "rows", "users"]} != \
+           {key: report["metadata"][key] for key in ["backend", "rows", "users"]}:
+            logging.info(f"Baseline {args.baseline} was recorded with different settings, comparing anyway")
+
+        report["comparison"] = compare_results(results, baseline, args.tolerance)
+
+    output = json.dumps(report, indent=2)
+
+    print(output)
+
+    if args.output:
+        args.output.write_text(output)
+
+    if args.save_baseline:
+        args.baseline.write_text(output)
+
+        logging.info(f"Baseline saved to {args.baseline}")
+
+    if args.backend == "mongod" and not args.keep:
+        client.drop_database(BENCHMARK_DATABASE)
+
+    regressions = [name for name, comparison in report.get("comparison", {}).items() if comparison["regression"]]
+
+    if regressions:
+        logging.error(f"Regressions over {args.tolerance:.0%}: {regressions}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(get_parser().parse_args()))
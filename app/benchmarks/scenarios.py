@@ -0,0 +1,141 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from datetime import timedelta
+from utils import plotter
+from utils.models import Movement, MovementType
+from utils.runtime import run_async
+from utils.utils import get_accept_operations, write_accept_operations
+from utils.movements import build_history_query, get_history_page, get_distinct_values, get_datetime_range, compact_movements
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+HISTORY_WALK_PAGES = 10
+HISTORY_WINDOW     = timedelta(days=90)
+ACCEPT_BATCH_SIZE  = 5
+
+SCENARIOS = {}
+
+LEGACY_PLOTTER_FUNCTIONS = [
+    "get_current_week_movements",
+    "get_last_week_movements",
+    "get_current_day_movements",
+    "get_last_day_movements",
+    "get_last_month_movements",
+    "get_current_month_movements"
+]
+
+def scenario(name: str):
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+
+    return register
+
+@scenario("plotter.get_total_movements_by_month")
+def run_total_movements_by_month(context: dict):
+    return plotter.get_total_movements_by_month(context["frame"], MovementType.EXPENSE)
+
+@scenario("plotter.get_period_totals")
+def run_period_totals(context: dict):
+    return plotter.get_period_totals(context["frame"], context["now"])
+
+@scenario("plotter.plot_line_total_movements_by_month")
+def run_plot_line_total_movements_by_month(context: dict):
+    return plotter.plot_line_total_movements_by_month(context["frame"], MovementType.EXPENSE)
+
+@scenario("plotter.plot_total_movements_by_month")
+def run_plot_total_movements_by_month(context: dict):
+    return plotter.plot_total_movements_by_month(context["frame"], MovementType.EXPENSE)
+
+@scenario("plotter.plot_pie_movement_by_category")
+def run_plot_pie_movement_by_category(context: dict):
+    return plotter.plot_pie_movement_by_category(context["frame"], MovementType.EXPENSE)
+
+@scenario("plotter.plot_bar_movement_by_source_name")
+def run_plot_bar_movement_by_source_name(context: dict):
+    return plotter.plot_bar_movement_by_source_name(context["frame"], MovementType.EXPENSE)
+
+def register_legacy_plotter_scenario(function_name: str):
+    # The legacy helpers overwrite the datetime column, so each run gets its own shallow copy
+    @scenario(f"plotter.{function_name}")
+    def run_legacy_plotter_function(context: dict):
+        return getattr(plotter, function_name)(context["frame"].copy(deep=False), MovementType.EXPENSE)
+
+for legacy_function_name in LEGACY_PLOTTER_FUNCTIONS:
+    register_legacy_plotter_scenario(legacy_function_name)
+
+@scenario("history.filter_options")
+def run_history_filter_options(context: dict):
+    finance_collection = context["finance_collection"]
+
+    return (
+        get_distinct_values(finance_collection, context["username"], "category"),
+        get_distinct_values(finance_collection, context["username"], "source_name"),
+        get_datetime_range(finance_collection, context["username"])
+    )
+
+@scenario("history.first_page")
+def run_history_first_page(context: dict):
+    return get_history_page(context["finance_collection"], build_history_query(context["username"]))
+
+@scenario("history.filtered_page")
+def run_history_filtered_page(context: dict):
+    query = build_history_query(
+        context["username"],
+        category=context["category"],
+        movement_type=MovementType.EXPENSE.value,
+        init_date=(context["now"] - HISTORY_WINDOW).date(),
+        end_date=context["now"].date()
+    )
+
+    return get_history_page(context["finance_collection"], query)
+
+@scenario("history.paginate")
+def run_history_paginate(context: dict):
+    query = build_history_query(context["username"])
+    after = None
+
+    for _ in range(HISTORY_WALK_PAGES):
+        _, after = get_history_page(context["finance_collection"], query, after)
+
+        if after is None:
+            break
+
+    return after
+
+def get_accept_batch(context: dict) -> list:
+    source = context["source"]
+
+    return [
+        Movement(
+            name="Benchmark",
+            description="Movimiento de benchmark",
+            movement_type=MovementType.EXPENSE,
+            amount=float(amount),
+            source_name=source["source_name"],
+            source_type=source["source_type"],
+            category=context["category"]
+        )
+        for amount in np.round(context["rng"].lognormal(5.5, 1.0, ACCEPT_BATCH_SIZE), 2)
+    ]
+
+@scenario("accept.operations")
+def run_accept_operations(context: dict):
+    return get_accept_operations(get_accept_batch(context), context["username"])
+
+@scenario("accept.write")
+def run_accept_write(context: dict):
+    operations = get_accept_operations(get_accept_batch(context), context["username"])
+
+    return run_async(write_accept_operations(context["async_collections"], operations, context["username"]))
+
+def get_scenarios(patterns: list = None) -> dict:
+    if not patterns:
+        return dict(SCENARIOS)
+
+    return {name: function for name, function in SCENARIOS.items() if any(name.startswith(pattern) for pattern in patterns)}
+
+def get_benchmark_frame(movements: pd.DataFrame, username: str) -> pd.DataFrame:
+    return compact_movements(movements[movements["username"] == username])
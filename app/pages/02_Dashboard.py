@@ -2,8 +2,15 @@ import logging
 import pandas as pd
 import streamlit as st
 
-from utils.database import get_collection
+from utils.database import get_collection, get_read_profile
+from utils.rollups import load_rollups
+from utils.figure_cache import CHART_BUILDERS, get_data_version, get_figure
+from utils.watcher import has_changed
+from utils.dates import get_now
+from utils.movements import load_movements
 from utils.plotter import *
+from utils.aggregations import get_period_metrics, get_period_total
+from utils.telemetry import span, timed, record_error
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
@@ -16,37 +23,31 @@ st.set_page_config(
 if "movements" not in st.session_state:
     st.session_state.movements = None
 
-def get_all_movements():
+@timed("page.dashboard.metrics")
+def get_movement_metrics():
     try:
         finance_collection = get_collection(
             st.secrets.db_credentials.uri,
             st.secrets.db_credentials.database_name,
-            st.secrets.db_collections.finance_collection_name
+            st.secrets.db_collections.finance_collection_name,
+            get_read_profile(st.session_state.username)
         )
 
-        all_movements = finance_collection.find(
-            {
-                "username": st.session_state.username
-            }
-        )
-
-        if all_movements:
-            return pd.DataFrame(list(all_movements))
-        else:
-            return None
+        return get_period_metrics(finance_collection, st.session_state.username)
     except Exception as e:
-        logging.error(f"Error getting the movements collection: {e}")
+        logging.error(f"Error getting the movement metrics: {e}")
+        record_error()
         return None
 
-def show_metrics_by_movement_type(movements: pd.DataFrame, movement_type: MovementType):
-    current_month_total = get_current_month_movements(movements, movement_type)
-    last_month_total    = get_last_month_movements(movements, movement_type)
+def show_metrics_by_movement_type(metrics: pd.DataFrame, movement_type: MovementType):
+    current_month_total = get_period_total(metrics, movement_type, "month", "current")
+    last_month_total    = get_period_total(metrics, movement_type, "month", "previous")
 
-    current_week_total  = get_current_week_movements(movements, movement_type)
-    last_week_total     = get_last_week_movements(movements, movement_type)
+    current_week_total  = get_period_total(metrics, movement_type, "week", "current")
+    last_week_total     = get_period_total(metrics, movement_type, "week", "previous")
 
-    current_day_total   = get_current_day_movements(movements, movement_type)
-    last_day_total      = get_last_day_movements(movements, movement_type)
+    current_day_total   = get_period_total(metrics, movement_type, "day", "current")
+    last_day_total      = get_period_total(metrics, movement_type, "day", "previous")
 
     col_1, col_2, col_3 = st.columns(3)
 
@@ -78,41 +79,59 @@ def show_metrics_by_movement_type(movements: pd.DataFrame, movement_type: Moveme
         )
 
 @st.fragment(run_every=10)
-def show_metrics_cards(movements: pd.DataFrame):
-    show_metrics_by_movement_type(movements, MovementType.EXPENSE)
-    show_metrics_by_movement_type(movements, MovementType.INCOME)
+@timed("page.dashboard.metrics_fragment")
+def show_metrics_cards():
+    metrics_key = (st.session_state.username, get_now().date())
+
+    if has_changed(st.session_state.username, "metrics_version") or st.session_state.get("metrics_key") != metrics_key:
+        st.session_state.metrics     = get_movement_metrics()
+        st.session_state.metrics_key = metrics_key
+
+    metrics = st.session_state.metrics
+
+    show_metrics_by_movement_type(metrics, MovementType.EXPENSE)
+    show_metrics_by_movement_type(metrics, MovementType.INCOME)
+
+@timed("page.dashboard.movements")
+def load_dashboard_movements() -> pd.DataFrame:
+    movements = load_rollups(st.session_state.username)
+
+    if movements is None or movements.empty:
+        movements = load_movements(st.session_state.username)
+
+    return movements
 
 @st.fragment(run_every=10)
-def show_plots(movements: pd.DataFrame):
-    col_1, col_2 = st.columns(2)
+@timed("page.dashboard.plots_fragment")
+def show_plots():
+    username = st.session_state.username
 
-    with col_1:
-        st.plotly_chart(plot_pie_movement_by_category(movements, MovementType.EXPENSE))
-        st.plotly_chart(plot_total_movements_by_month(movements, MovementType.EXPENSE))
-        st.plotly_chart(plot_line_total_movements_by_month(movements, MovementType.EXPENSE))
-        st.plotly_chart(plot_bar_movement_by_source_name(movements, MovementType.EXPENSE))
-    
-    with col_2:
-        st.plotly_chart(plot_pie_movement_by_category(movements, MovementType.INCOME))
-        st.plotly_chart(plot_total_movements_by_month(movements, MovementType.INCOME))
-        st.plotly_chart(plot_line_total_movements_by_month(movements, MovementType.INCOME))
-        st.plotly_chart(plot_bar_movement_by_source_name(movements, MovementType.INCOME))
+    if has_changed(username, "plots_version") or st.session_state.get("plots_data") is None:
+        movements = load_dashboard_movements()
+        st.session_state.plots_data = (movements, get_data_version(movements))
+
+    movements, version = st.session_state.plots_data
 
+    for column, movement_type in zip(st.columns(2), [MovementType.EXPENSE, MovementType.INCOME]):
+        with column:
+            for chart_kind in CHART_BUILDERS:
+                st.plotly_chart(get_figure(username, version, chart_kind, movement_type, movements))
 
 def show_dashboard_page():
     st.subheader("📊 Dashboard")
 
     st.divider()
 
-    movements = get_all_movements()
+    movements = load_dashboard_movements()
     
     if movements is None or movements.empty:
         st.warning("No movements found")
     else:
-        show_metrics_cards(movements)
-        show_plots(movements)
+        show_metrics_cards()
+        show_plots()
 
 if "authentication_status" in st.session_state and st.session_state.authentication_status:
-    show_dashboard_page()
+    with span("page.dashboard"):
+        show_dashboard_page()
 else:
     st.switch_page("./Home.py")
\ No newline at end of file
@@ -2,7 +2,12 @@ import logging
 import pandas as pd
 import streamlit as st
 
-from utils.database import get_collection
+from utils.dates import parse_movement_datetime, parse_datetimes
+from utils.database import get_read_profile
+from utils.exporter import EXPORT_FORMATS, get_export_data
+from utils.movements import (get_finance_collection, build_history_query, get_history_page,
+                             get_distinct_values, get_datetime_range)
+from utils.telemetry import span
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
@@ -12,84 +17,113 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_all_movements():
-    try:
-        finance_collection = get_collection(
-            st.secrets.db_credentials.uri,
-            st.secrets.db_credentials.database_name,
-            st.secrets.db_collections.finance_collection_name
-        )
+if "history_page_keys" not in st.session_state:
+    st.session_state.history_page_keys = [None]
 
-        all_movements = finance_collection.find(
-            {
-                "username": st.session_state.username
-            }
-        )
+if "history_query" not in st.session_state:
+    st.session_state.history_query = None
 
-        if all_movements:
-            return pd.DataFrame(list(all_movements))
-        else:
-            return None
-    except Exception as e:
-        logging.error(f"Error getting the movements collection: {e}")
-        return None
+def to_date(value):
+    value = parse_movement_datetime(value)
+
+    return value.date() if value is not None else None
+
+def show_filters(finance_collection, username: str) -> dict:
+    categories     = get_distinct_values(finance_collection, username, "category")
+    source_names   = get_distinct_values(finance_collection, username, "source_name")
+    movement_types = get_distinct_values(finance_collection, username, "movement_type")
+    source_types   = get_distinct_values(finance_collection, username, "source_type")
+
+    first_datetime, last_datetime = get_datetime_range(finance_collection, username)
+
+    with st.expander("🔍 Filters"):
+
+        col_1, col_2 = st.columns(2)
+
+        with col_1:
+            selected_category      = st.selectbox("Select a category", categories, index=None)
+            selected_source_name   = st.selectbox("Select a source name", source_names, index=None)
+            init_date              = st.date_input("Select a initial date", to_date(first_datetime))
+
+        with col_2:
+            selected_movement_type = st.selectbox("Select a movement type", movement_types, index=None)
+            selected_source_type   = st.selectbox("Select a source type", source_types, index=None)
+            end_date               = st.date_input("Select a end date", to_date(last_datetime))
+
+        if init_date and end_date and init_date > end_date:
+            st.warning("The initial date must be less than the end date")
+            init_date, end_date = None, None
+
+    return build_history_query(
+        username,
+        category=selected_category,
+        source_name=selected_source_name,
+        movement_type=selected_movement_type,
+        source_type=selected_source_type,
+        init_date=init_date,
+        end_date=end_date
+    )
+
+def show_pagination(next_key):
+    page_keys   = st.session_state.history_page_keys
+    page_number = len(page_keys)
+
+    col_previous, col_page, col_next = st.columns([0.2, 0.6, 0.2])
+
+    with col_previous:
+        if st.button("⬅️ Previous", disabled=page_number == 1, use_container_width=True):
+            page_keys.pop()
+            st.rerun()
+
+    with col_page:
+        st.caption(f"Page {page_number}")
+
+    with col_next:
+        if st.button("Next ➡️", disabled=next_key is None, use_container_width=True):
+            page_keys.append(next_key)
+            st.rerun()
+
+def show_export(finance_collection, query: dict):
+    with st.expander("⬇️ Export"):
+        file_format = st.radio("Format", list(EXPORT_FORMATS.keys()), horizontal=True)
+
+        st.download_button(
+            f"Download {file_format}",
+            data=get_export_data(finance_collection, query, file_format),
+            file_name=f"finbot_movements.{EXPORT_FORMATS[file_format]['extension']}",
+            mime=EXPORT_FORMATS[file_format]["mime"],
+            icon="⬇️"
+        )
 
 def show_history_page():
     st.subheader("📋 History")
 
-    movements = get_all_movements()
-    
-    if movements is None or movements.empty:
+    try:
+        username           = st.session_state.username
+        finance_collection = get_finance_collection(get_read_profile(username))
+
+        query = show_filters(finance_collection, username)
+
+        if query != st.session_state.history_query:
+            st.session_state.history_query     = query
+            st.session_state.history_page_keys = [None]
+
+        movements, next_key = get_history_page(finance_collection, query, st.session_state.history_page_keys[-1])
+
+        show_export(finance_collection, query)
+    except Exception as e:
+        logging.error(f"Error getting the movements page: {e}")
+        movements, next_key = [], None
+
+    if not movements:
         st.warning("No movements found")
     else:
-        movements['_id'] = movements['_id'].astype(str)
-
-
-        categories     = movements["category"].unique()
-        source_names   = movements["source_name"].unique()
-        movement_types = movements["movement_type"].unique()
-        source_types   = movements["source_type"].unique()
-
-        with st.expander("🔍 Filters"):
-
-            col_1, col_2 = st.columns(2)
-
-            with col_1:
-                selected_category      = st.selectbox("Select a category", categories, index=None)
-                selected_source_name   = st.selectbox("Select a source name", source_names, index=None)
-                init_date              = st.date_input("Select a initial date", movements["datetime"].min())
-            
-            with col_2:
-                selected_movement_type = st.selectbox("Select a movement type", movement_types, index=None)
-                selected_source_type   = st.selectbox("Select a source type", source_types, index=None)
-                end_date               = st.date_input("Select a end date", movements["datetime"].max())
-
-            if selected_category:
-                movements = movements[movements["category"] == selected_category]
-            
-            if selected_source_name:
-                movements = movements[movements["source_name"] == selected_source_name]
-            
-            if selected_movement_type:
-                movements = movements[movements["movement_type"] == selected_movement_type]
-            
-            if selected_source_type:
-                movements = movements[movements["source_type"] == selected_source_type]
-            
-            if init_date and end_date:
-                if init_date > end_date:
-                    st.warning("The initial date must be less than the end date")
-                elif init_date == end_date:
-                    movements["datetime"] = pd.to_datetime(movements["datetime"])
-                    movements = movements[movements["datetime"].dt.date == init_date]
-                else:
-                    movements["datetime"] = pd.to_datetime(movements["datetime"])  # Convertir a datetime
-                    logging.info(f"Filtering movements from {init_date} to {end_date}")
-                    movements = movements[(movements["datetime"].dt.date >= init_date) & (movements["datetime"].dt.date <= end_date)]
+        movements = pd.DataFrame(movements).drop(columns=["_id"])
+        movements["datetime"] = parse_datetimes(movements["datetime"])
 
         st.text("📜 Movements")
         st.dataframe(
-            movements.drop(columns=["_id", "username"]).sort_values(by="datetime", ascending=False),
+            movements,
             column_config= {
                 "datetime": "📅 Fecha y hora",
                 "name": "👤 Movimiento",
@@ -104,7 +138,10 @@ def show_history_page():
             use_container_width=True
         )
 
+    show_pagination(next_key)
+
 if "authentication_status" in st.session_state and st.session_state.authentication_status:
-    show_history_page()
+    with span("page.history"):
+        show_history_page()
 else:
-    st.switch_page("./Home.py")
\ No newline at end of file
+    st.switch_page("./Home.py")
@@ -1,10 +1,16 @@
 import logging
 import pandas as pd
 import streamlit as st
+import plotly.express as px
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from utils.dates import get_now
 from utils.models import SourceType
-from utils.database import get_collection
+from utils.database import get_collection, get_read_profile, mark_user_write
+from utils.utils import invalidate_user_resources
+from utils.reconciliation import get_reconciliation_collections, reconcile_balances
+from utils.checkpoints import BALANCE_HISTORY_DAYS, get_checkpoint_collections, create_checkpoints, get_balance_history
+from utils.telemetry import span, timed, record_error
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
@@ -15,12 +21,14 @@ source_icons = {
     SourceType.VALE.value: "🎫",
 }
 
+@timed("page.wallet.sources")
 def get_wallet():
     try:
         sources_collection = get_collection(
             st.secrets.db_credentials.uri,
             st.secrets.db_credentials.database_name,
-            st.secrets.db_collections.sources_collection_name
+            st.secrets.db_collections.sources_collection_name,
+            get_read_profile(st.session_state.username)
         )
 
         sources = sources_collection.find(
@@ -35,6 +43,7 @@ def get_wallet():
             return None
     except Exception as e:
         logging.error(f"Error getting the sources: {e}")
+        record_error()
         return None
 
 def show_source_card(source:dict):
@@ -52,6 +61,41 @@ def show_source_card(source:dict):
             st.write(f"**Last 4 digits:** *{source['last_digits']}*")
         st.write(f"**Type:** :blue-background[{source['source_type']}]")
 
+        show_balance_history(source)
+
+def refresh_checkpoints():
+    # Checkpoints only cover closed months, so one refresh per day is enough
+    if st.session_state.get("checkpoints_refreshed_on") != get_now().date():
+        finance_collection, sources_collection, checkpoints_collection = get_checkpoint_collections()
+
+        create_checkpoints(finance_collection, sources_collection, checkpoints_collection, st.session_state.username)
+
+        st.session_state.checkpoints_refreshed_on = get_now().date()
+
+def show_balance_history(source: dict):
+    finance_collection, _, checkpoints_collection = get_checkpoint_collections(get_read_profile(st.session_state.username))
+
+    history = get_balance_history(
+        finance_collection,
+        checkpoints_collection,
+        source,
+        start=get_now() - timedelta(days=BALANCE_HISTORY_DAYS)
+    )
+
+    if history is None or len(history) < 2:
+        return
+
+    fig = px.line(
+        history,
+        x="datetime",
+        y="balance",
+        line_shape="hv",
+        title=f"Balance over the last {BALANCE_HISTORY_DAYS} days",
+        labels={"balance": "Balance ($)", "datetime": "Date"}
+    )
+
+    st.plotly_chart(fig, use_container_width=True, key=f"balance_history_{source['source_name']}_{source['source_type']}")
+
 
 def show_form():
     st.write("### Add a new source to your wallet")
@@ -82,16 +126,46 @@ def show_form():
                     "source_type": source_type,
                     "last_digits": last_digits,
                     "source_balance": source_balance,
+                    "opening_balance": source_balance,
                     "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
             )
 
+            mark_user_write(st.session_state.username)
+            invalidate_user_resources()
+
             st.toast("Source added successfully", icon="🎉")
             st.rerun()
         except Exception as e:
             logging.error(f"Error adding the source to the wallet: {e}")
             st.error("Error adding the source")
 
+def show_reconciliation():
+    if st.button("Reconcile balances", icon="🔄", help="Recompute the balances from your movements"):
+        finance_collection, sources_collection = get_reconciliation_collections()
+
+        summary = reconcile_balances(finance_collection, sources_collection, repair=True, usernames=[st.session_state.username])
+
+        if summary is None:
+            st.error("Error reconciling the balances")
+        elif summary["repaired"]:
+            mark_user_write(st.session_state.username)
+            invalidate_user_resources()
+
+            st.toast(f"{summary['repaired']} balances corrected", icon="🔄")
+            st.rerun()
+        elif not summary["drifted"]:
+            st.toast("Your balances match your movements", icon="✅")
+
+        if summary and summary["skipped_repairs"]:
+            st.warning(
+                f"{summary['skipped_repairs']} balances differ from your movements but were not corrected, "
+                "an import is still running or movements are not accepted in transactions"
+            )
+
+        if summary and summary["missing_opening_balance"]:
+            st.warning(f"{summary['missing_opening_balance']} sources have no opening balance yet and were skipped")
+
 def show_wallet_page():
     st.subheader("💰 Wallet")
 
@@ -103,13 +177,18 @@ def show_wallet_page():
         if wallets is None or wallets.empty:
             st.warning("There are nothing in your wallet yet. Add a new source!")
         else:
+            refresh_checkpoints()
+
             for _, source in wallets.iterrows():
                 show_source_card(source)
+
+            show_reconciliation()
     
     with col_add_source:
         show_form()
 
 if "authentication_status" in st.session_state and st.session_state.authentication_status:
-    show_wallet_page()
+    with span("page.wallet"):
+        show_wallet_page()
 else:
     st.switch_page("./Home.py")
\ No newline at end of file
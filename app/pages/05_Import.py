@@ -0,0 +1,105 @@
+import logging
+import pandas as pd
+import streamlit as st
+
+from utils.movements import invalidate_movements
+from utils.utils import get_user_resources, invalidate_user_resources
+from utils.importer import IMPORT_CHUNK_SIZE, iter_csv_chunks, iter_ofx_chunks, import_statement
+from utils.telemetry import span
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+st.set_page_config(
+    page_title="Import | Finbot",
+    page_icon="📥",
+    layout="wide"
+)
+
+def show_csv_mapping(file) -> dict:
+    columns = list(pd.read_csv(file, nrows=0).columns)
+    file.seek(0)
+
+    col_1, col_2 = st.columns(2)
+
+    with col_1:
+        datetime_column    = st.selectbox("📅 Date column", columns)
+        amount_column      = st.selectbox("💲 Amount column (negative for expenses)", columns)
+        name_column        = st.selectbox("👤 Name column", columns)
+
+    with col_2:
+        description_column = st.selectbox("📝 Description column", columns, index=None)
+        category_column    = st.selectbox("🏷️ Category column", columns, index=None)
+        date_format        = st.text_input("Date format (optional)", placeholder="%d/%m/%Y")
+
+    return {
+        "columns": {
+            "datetime": datetime_column,
+            "amount": amount_column,
+            "name": name_column,
+            "description": description_column,
+            "category": category_column
+        },
+        "date_format": date_format or None
+    }
+
+def show_import_page():
+    st.subheader("📥 Import")
+
+    username = st.session_state.username
+    sources, categories = get_user_resources(username)
+
+    if not sources:
+        st.warning("Add a source to your wallet before importing a statement.")
+        return
+
+    file = st.file_uploader("Bank statement", type=["csv", "ofx", "qfx"])
+
+    source = st.selectbox(
+        "Source",
+        sources,
+        format_func=lambda source: f"{source['source_name']} - {source['source_type']}"
+    )
+
+    if file is None:
+        return
+
+    is_csv = file.name.lower().endswith(".csv")
+
+    if is_csv:
+        mapping = show_csv_mapping(file)
+
+    if st.button("Import", icon="📥"):
+        progress = st.progress(0.0, text="Importing movements...")
+
+        def on_progress(imported: int):
+            progress.progress(min(file.tell() / max(file.size, 1), 1.0), text=f"{imported:,} movements imported")
+
+        try:
+            if is_csv:
+                chunks      = iter_csv_chunks(file, mapping["columns"], IMPORT_CHUNK_SIZE)
+                date_format = mapping["date_format"]
+            else:
+                chunks      = iter_ofx_chunks(file, IMPORT_CHUNK_SIZE)
+                date_format = "%Y%m%d%H%M%S"
+
+            summary = import_statement(chunks, username, source, categories, date_format, on_progress)
+
+            progress.progress(1.0, text="Import finished")
+
+            invalidate_user_resources()
+            invalidate_movements(username)
+
+            st.success(
+                f"{summary['imported']:,} movements imported, {summary['skipped']:,} rows skipped, "
+                f"{summary['duplicates']:,} already imported. "
+                f"Balance change: ${summary['balance_delta']:,.2f}"
+            )
+        except Exception as e:
+            logging.error(f"Error importing the statement: {e}")
+            st.error("Error importing the statement")
+
+if "authentication_status" in st.session_state and st.session_state.authentication_status:
+    with span("page.import"):
+        show_import_page()
+else:
+    st.switch_page("./Home.py")
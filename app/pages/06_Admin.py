@@ -0,0 +1,131 @@
+import logging
+import pandas as pd
+import streamlit as st
+
+from utils.database import get_pool_stats
+from utils.llm_cache import get_cache_stats
+from utils.fast_parser import get_fast_parser_stats
+from utils.figure_cache import get_figure_cache_stats
+from utils.telemetry import (get_metrics_snapshot, get_profiles, reset_metrics, is_enabled, set_enabled,
+                             is_profiling, set_profiling, start_metrics_server)
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+st.set_page_config(
+    page_title="Admin | Finbot",
+    page_icon="🛠️",
+    layout="wide"
+)
+
+def is_admin() -> bool:
+    try:
+        return st.session_state.username in st.secrets.get("admin", {}).get("usernames", [])
+    except Exception as e:
+        logging.error(f"Error reading the admin users: {e}")
+        return False
+
+def show_controls():
+    col_enabled, col_profiling, col_reset = st.columns(3)
+
+    with col_enabled:
+        enabled = st.toggle("Collect metrics", value=is_enabled())
+
+        if enabled != is_enabled():
+            set_enabled(enabled)
+
+    with col_profiling:
+        profiling = st.toggle("Profile spans", value=is_profiling(), help="Runs cProfile on one span at a time")
+
+        if profiling != is_profiling():
+            set_profiling(profiling)
+
+    with col_reset:
+        if st.button("Reset metrics", icon="🧹"):
+            reset_metrics()
+            st.rerun()
+
+def show_latencies():
+    metrics = pd.DataFrame(get_metrics_snapshot())
+
+    if metrics.empty:
+        st.info("No operations recorded yet")
+        return
+
+    st.dataframe(
+        metrics.sort_values("total_seconds", ascending=False),
+        column_config={
+            "operation": "Operation",
+            "count": "Count",
+            "errors": "Errors",
+            "total_seconds": st.column_config.NumberColumn("Total (s)", format="%.3f"),
+            "mean_seconds": st.column_config.NumberColumn("Mean (s)", format="%.4f"),
+            "p50_seconds": st.column_config.NumberColumn("p50 ≤ (s)", format="%.3f"),
+            "p95_seconds": st.column_config.NumberColumn("p95 ≤ (s)", format="%.3f"),
+            "max_seconds": st.column_config.NumberColumn("Max (s)", format="%.4f")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+def show_profiles():
+    profiles = get_profiles()
+
+    if not profiles:
+        st.caption("Turn on span profiling to capture the latest profile of each operation")
+        return
+
+    operation = st.selectbox("Operation", sorted(profiles.keys()))
+    st.code(profiles[operation], language="text")
+
+def show_caches():
+    cache_stats  = get_cache_stats()
+    parser_stats = get_fast_parser_stats()
+    figure_stats = get_figure_cache_stats()
+
+    col_1, col_2, col_3, col_4 = st.columns(4)
+
+    with col_1:
+        st.metric("LLM cache hit rate", f"{cache_stats['hit_rate']:.0%}", border=True)
+
+    with col_2:
+        st.metric("Local parser coverage", f"{parser_stats['coverage']:.0%}", border=True)
+
+    with col_3:
+        figures = figure_stats["figures"]
+        lookups = figures["hits"] + figures["misses"]
+        st.metric("Figure cache hit rate", f"{figures['hits'] / lookups if lookups else 0:.0%}", border=True)
+
+    with col_4:
+        st.metric("Cached figures", figures["size"], border=True)
+
+    st.dataframe(pd.DataFrame(get_pool_stats()), hide_index=True, use_container_width=True)
+
+def show_admin_page():
+    st.subheader("🛠️ Admin")
+
+    metrics_url = start_metrics_server()
+
+    if metrics_url:
+        st.caption(f"Prometheus endpoint: {metrics_url}")
+    else:
+        st.caption("Prometheus endpoint off, set telemetry.exporter in the secrets to expose /metrics")
+
+    show_controls()
+
+    st.divider()
+
+    latencies_tab, profiles_tab, caches_tab = st.tabs(["Latencies", "Profiles", "Caches and pools"])
+
+    with latencies_tab:
+        show_latencies()
+
+    with profiles_tab:
+        show_profiles()
+
+    with caches_tab:
+        show_caches()
+
+if "authentication_status" in st.session_state and st.session_state.authentication_status and is_admin():
+    show_admin_page()
+else:
+    st.switch_page("./Home.py")
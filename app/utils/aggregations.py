@@ -0,0 +1,72 @@
+import logging
+import pandas as pd
+
+from datetime import datetime
+from utils.models import MovementType
+from utils.dates import get_period_bounds, get_datetime_range_query, get_datetime_expression
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+def build_period_metrics_pipeline(username: str, now: datetime = None) -> list:
+    bounds = get_period_bounds(now)
+    lower  = min(start for start, _ in bounds.values())
+    upper  = max(end for _, end in bounds.values())
+
+    group = {"_id": "$movement_type"}
+
+    for (period, window), (start, end) in bounds.items():
+        in_range = {
+            "$and": [
+                {"$gte": ["$movement_datetime", start]},
+                {"$lt": ["$movement_datetime", end]}
+            ]
+        }
+
+        group[f"{window}_{period}"] = {"$sum": {"$cond": [in_range, "$amount", 0]}}
+
+    return [
+        {"$match": {"username": username, **get_datetime_range_query(lower, upper)}},
+        {"$set": {"movement_datetime": get_datetime_expression()}},
+        {"$group": group}
+    ]
+
+@timed()
+def get_period_metrics(finance_collection, username: str, now: datetime = None) -> pd.DataFrame:
+    try:
+        bounds  = get_period_bounds(now)
+        results = {
+            result["_id"]: result
+            for result in finance_collection.aggregate(build_period_metrics_pipeline(username, now))
+        }
+
+        rows = []
+
+        for movement_type in MovementType:
+            result = results.get(movement_type.value, {})
+
+            for period, window in bounds:
+                rows.append(
+                    {
+                        "movement_type": movement_type.value,
+                        "period": period,
+                        "window": window,
+                        "amount": float(result.get(f"{window}_{period}", 0.0))
+                    }
+                )
+
+        return pd.DataFrame(rows)
+    except Exception as e:
+        logging.error(f"Error getting the period metrics: {e}")
+        record_error()
+        return None
+
+def get_period_total(metrics: pd.DataFrame, movement_type: MovementType, period: str, window: str) -> float:
+    if metrics is None or metrics.empty:
+        return 0.0
+
+    selected = metrics[(metrics["movement_type"] == movement_type.value) &
+                       (metrics["period"] == period) &
+                       (metrics["window"] == window)]["amount"]
+
+    return float(selected.sum())
@@ -0,0 +1,265 @@
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from datetime import datetime, timedelta
+from pymongo import UpdateOne, DESCENDING
+from utils.models import MovementType, SourceType
+from utils.database import get_collection, get_collection_name
+from utils.dates import get_now, parse_datetimes, get_datetime_range_query, get_datetime_expression
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+CHECKPOINT_KEY_FIELDS = ["username", "source_name", "source_type"]
+BALANCE_HISTORY_DAYS  = 180
+
+def get_checkpoint_collections(profile: str = None) -> tuple:
+    return tuple(
+        get_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            get_collection_name(collection_key),
+            profile
+        )
+        for collection_key in ["finance_collection_name", "sources_collection_name", "checkpoints_collection_name"]
+    )
+
+def get_month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def get_source_filter(source: dict) -> dict:
+    return {field: source[field] for field in CHECKPOINT_KEY_FIELDS}
+
+def get_datetime_filter(start: datetime = None, end: datetime = None) -> dict:
+    return get_datetime_range_query(start, end) if start is not None or end is not None else {}
+
+def get_latest_checkpoints(checkpoints_collection, username: str) -> dict:
+    latest = checkpoints_collection.aggregate(
+        [
+            {"$match": {"username": username}},
+            {"$sort": {"as_of": -1}},
+            {
+                "$group": {
+                    "_id": {field: f"${field}" for field in CHECKPOINT_KEY_FIELDS},
+                    "as_of": {"$first": "$as_of"},
+                    "delta": {"$first": "$delta"}
+                }
+            }
+        ]
+    )
+
+    return {tuple(checkpoint["_id"][field] for field in CHECKPOINT_KEY_FIELDS): checkpoint for checkpoint in latest}
+
+def build_monthly_deltas_pipeline(username: str, start: datetime = None, end: datetime = None) -> list:
+    return [
+        {"$match": {"username": username, **get_datetime_filter(start, end)}},
+        {
+            "$group": {
+                "_id": {
+                    "source_name": "$source_name",
+                    "source_type": "$source_type",
+                    "year": {"$year": get_datetime_expression()},
+                    "month": {"$month": get_datetime_expression()}
+                },
+                "delta": {
+                    "$sum": {
+                        "$cond": [
+                            {"$eq": ["$movement_type", MovementType.EXPENSE.value]},
+                            {"$multiply": ["$amount", -1]},
+                            "$amount"
+                        ]
+                    }
+                }
+            }
+        }
+    ]
+
+def get_checkpoint_epochs(sources_collection, username: str) -> dict:
+    return {
+        (source["source_name"], source["source_type"]): source.get("checkpoint_epoch", 0)
+        for source in sources_collection.find({"username": username}, {"source_name": 1, "source_type": 1, "checkpoint_epoch": 1})
+    }
+
+def discard_stale_checkpoints(sources_collection, checkpoints_collection, username: str, epochs: dict, written: dict):
+    # Back-dated writes bump the source epoch after their movements land and before they delete the
+    # checkpoints. A bump since the epochs were read means the invalidation may have run before these
+    # upserts, so they are dropped and rebuilt on the next refresh.
+    current = get_checkpoint_epochs(sources_collection, username)
+
+    for (source_name, source_type), as_of in written.items():
+        if current.get((source_name, source_type)) != epochs.get((source_name, source_type)):
+            checkpoints_collection.delete_many(
+                {"username": username, "source_name": source_name, "source_type": source_type, "as_of": {"$in": as_of}}
+            )
+
+            logging.info(f"Checkpoints of {username} / {source_name} were invalidated while being created, dropped")
+
+def get_checkpoint_epoch_updates(invalidations: list) -> list:
+    return [
+        UpdateOne(
+            {field: invalidation[field] for field in CHECKPOINT_KEY_FIELDS},
+            {"$inc": {"checkpoint_epoch": 1}}
+        )
+        for invalidation in invalidations
+    ]
+
+@timed()
+def create_checkpoints(finance_collection, sources_collection, checkpoints_collection, username: str, until: datetime = None) -> int:
+    try:
+        # Checkpoints stop at the current month so new movements never invalidate them
+        # The epochs are read first so an invalidation of the checkpoints read next is always noticed
+        until   = get_month_start(until or get_now())
+        epochs  = get_checkpoint_epochs(sources_collection, username)
+        latest  = get_latest_checkpoints(checkpoints_collection, username)
+        sources = set(epochs)
+
+        # A source without checkpoints has to be replayed from its first movement
+        has_checkpoints = all((username, *source_key) in latest for source_key in sources)
+        start           = min((checkpoint["as_of"] for checkpoint in latest.values()), default=None) if has_checkpoints else None
+
+        deltas = pd.DataFrame(
+            [
+                {**document["_id"], "delta": document["delta"]}
+                for document in finance_collection.aggregate(build_monthly_deltas_pipeline(username, start, until))
+            ]
+        )
+
+        if deltas.empty:
+            return 0
+
+        deltas["as_of"] = pd.to_datetime(deltas[["year", "month"]].assign(day=1)) + pd.offsets.MonthBegin(1)
+        deltas          = deltas.sort_values("as_of")
+        updates         = []
+        written         = {}
+
+        for (source_name, source_type), source_deltas in deltas.groupby(["source_name", "source_type"], sort=False):
+            if (source_name, source_type) not in sources:
+                continue
+
+            checkpoint = latest.get((username, source_name, source_type))
+
+            if checkpoint is not None:
+                source_deltas = source_deltas[source_deltas["as_of"] > checkpoint["as_of"]]
+
+            base     = checkpoint["delta"] if checkpoint is not None else 0.0
+            balances = base + source_deltas["delta"].to_numpy(dtype=float).cumsum()
+
+            written[(source_name, source_type)] = [as_of.to_pydatetime() for as_of in source_deltas["as_of"]]
+
+            updates += [
+                UpdateOne(
+                    {"username": username, "source_name": source_name, "source_type": source_type, "as_of": as_of.to_pydatetime()},
+                    {"$set": {"delta": float(balance)}},
+                    upsert=True
+                )
+                for as_of, balance in zip(source_deltas["as_of"], balances)
+            ]
+
+        if updates:
+            checkpoints_collection.bulk_write(updates, ordered=False)
+            discard_stale_checkpoints(sources_collection, checkpoints_collection, username, epochs, written)
+
+        logging.info(f"{len(updates)} balance checkpoints created for {username}")
+
+        return len(updates)
+    except Exception as e:
+        logging.error(f"Error creating the balance checkpoints: {e}")
+        record_error()
+        return 0
+
+def get_checkpoint_invalidations(movement_dicts: list, username: str, now: datetime = None) -> list:
+    current_month = get_month_start(now or get_now())
+    oldest        = {}
+
+    for movement_dict in movement_dicts:
+        movement_datetime = pd.Timestamp(movement_dict["datetime"]).to_pydatetime()
+
+        # Only back-dated movements fall inside an already checkpointed month
+        if movement_datetime >= current_month:
+            continue
+
+        source_key         = (movement_dict["source_name"], SourceType(movement_dict["source_type"]).value)
+        oldest[source_key] = min(oldest.get(source_key, movement_datetime), movement_datetime)
+
+    return [
+        {"username": username, "source_name": source_name, "source_type": source_type, "as_of": {"$gt": movement_datetime}}
+        for (source_name, source_type), movement_datetime in oldest.items()
+    ]
+
+def get_nearest_checkpoint(checkpoints_collection, source: dict, when: datetime = None):
+    query = get_source_filter(source)
+
+    if when is not None:
+        query["as_of"] = {"$lte": when}
+
+    return checkpoints_collection.find_one(query, {"_id": 0, "as_of": 1, "delta": 1}, sort=[("as_of", DESCENDING)])
+
+@timed()
+def get_balance_history(finance_collection, checkpoints_collection, source: dict, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+    try:
+        opening = source.get("opening_balance")
+
+        # Without an opening balance the ledger only gives the change, not the balance
+        if opening is None or pd.isna(opening):
+            logging.info(f"No opening balance for {source['source_name']}, the balance history is skipped")
+            return None
+
+        checkpoint = get_nearest_checkpoint(checkpoints_collection, source, start) if start is not None else None
+        base       = opening + (checkpoint["delta"] if checkpoint is not None else 0.0)
+
+        movements = pd.DataFrame(
+            list(
+                finance_collection.find(
+                    {
+                        **get_source_filter(source),
+                        **get_datetime_filter(checkpoint["as_of"] if checkpoint is not None else None, end)
+                    },
+                    {"_id": 0, "datetime": 1, "movement_type": 1, "amount": 1}
+                )
+            ),
+            columns=["datetime", "movement_type", "amount"]
+        )
+
+        movements["datetime"] = parse_datetimes(movements["datetime"])
+        movements             = movements.sort_values("datetime", kind="stable", ignore_index=True)
+
+        signed_amounts = np.where(
+            movements["movement_type"] == MovementType.EXPENSE.value,
+            -movements["amount"].to_numpy(dtype=float),
+            movements["amount"].to_numpy(dtype=float)
+        )
+
+        movements["amount"]  = signed_amounts
+        movements["balance"] = base + signed_amounts.cumsum()
+
+        if start is None:
+            return movements[["datetime", "amount", "balance"]]
+
+        # Movements between the checkpoint and the start only move the starting balance
+        before        = movements["datetime"] < start
+        start_balance = movements.loc[before, "balance"].iloc[-1] if before.any() else base
+        start_row     = pd.DataFrame({"datetime": [pd.Timestamp(start)], "amount": [0.0], "balance": [start_balance]})
+
+        return pd.concat([start_row, movements.loc[~before, ["datetime", "amount", "balance"]]], ignore_index=True)
+    except Exception as e:
+        logging.error(f"Error getting the balance history: {e}")
+        record_error()
+        return None
+
+def get_balance_at(finance_collection, checkpoints_collection, source: dict, when: datetime) -> float:
+    history = get_balance_history(finance_collection, checkpoints_collection, source, when, when + timedelta(microseconds=1))
+
+    return float(history["balance"].iloc[-1]) if history is not None else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the monthly balance checkpoints of every source")
+    parser.add_argument("--username", action="append", help="Only create the checkpoints of these users")
+    args = parser.parse_args()
+
+    finance_collection, sources_collection, checkpoints_collection = get_checkpoint_collections()
+
+    for username in args.username or sources_collection.distinct("username"):
+        create_checkpoints(finance_collection, sources_collection, checkpoints_collection, username)
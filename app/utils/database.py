@@ -1,22 +1,305 @@
+import time
 import logging
+import argparse
+import threading
+import streamlit as st
 
 from pymongo import MongoClient
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from pymongo.monitoring import ConnectionPoolListener
+from motor.motor_asyncio import AsyncIOMotorClient
+from utils.telemetry import CommandTimingListener
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
+DEFAULT_CLIENT_OPTIONS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 0,
+    "maxIdleTimeMS": 60000,
+    "connectTimeoutMS": 5000,
+    "serverSelectionTimeoutMS": 5000,
+    "waitQueueTimeoutMS": 5000
+}
+
+DEFAULT_COLLECTION_NAMES = {
+    "migrations_collection_name": "migrations",
+    "llm_cache_collection_name": "llm_cache",
+    "checkpoints_collection_name": "source_checkpoints",
+    "users_collection_name": "users"
+}
+
+# Analytics pages tolerate slightly stale data from a secondary. Right after a
+# user writes, their reads go to the primary with majority read concern, which
+# sees every majority-acknowledged write of the accept path, until any secondary
+# the analytics profile may pick is guaranteed to have replicated the write.
+DEFAULT_READ_PROFILES = {
+    "analytics": {
+        "read_preference": "secondaryPreferred",
+        "max_staleness_seconds": 90,
+        "read_concern": "local"
+    },
+    "post_accept": {
+        "read_preference": "primary",
+        "read_concern": "majority"
+    }
+}
+
+MIN_MAX_STALENESS_SECONDS = 90
+DEFAULT_HEARTBEAT_MS      = 10000
+
+_clients      = {}
+_clients_lock = threading.Lock()
+
+# Last write per user, kept in process memory: it is lost on restart and not shared
+# between app replicas, where the user's reads fall back to the analytics profile
+_user_writes      = {}
+_user_writes_lock = threading.Lock()
+
+class PoolStatsListener(ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "connections_in_use": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "pools_cleared": 0
+        }
+
+    def _increment(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._increment("checkouts")
+        self._increment("connections_in_use")
+
+    def connection_checked_in(self, event):
+        self._increment("connections_in_use", -1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+def get_client_options() -> dict:
+    options = dict(DEFAULT_CLIENT_OPTIONS)
+
+    try:
+        options.update(st.secrets.get("db_pool", {}))
+    except Exception as e:
+        logging.info(f"Using the default Mongo pool options: {e}")
+
+    return options
+
+def _get_or_create_client(uri:str, kind:str):
+    key = (uri, kind)
+
+    with _clients_lock:
+        if key not in _clients:
+            listener = PoolStatsListener()
+            options  = get_client_options()
+
+            if kind == "async":
+                client = AsyncIOMotorClient(uri, event_listeners=[listener, CommandTimingListener()], **options)
+            else:
+                client = MongoClient(uri, event_listeners=[listener, CommandTimingListener()], **options)
+
+            _clients[key] = {"client": client, "listener": listener, "options": options}
+
+            logging.info(f"New {kind} Mongo client created with options: {options}")
+
+        return _clients[key]["client"]
+
 def get_mongo_client(uri:str):
     try:
-        client = MongoClient(uri)
-        return client
+        return _get_or_create_client(uri, "sync")
     except Exception as e:
         logging.info(f"Error connecting to the Mongo DB: {e}")
 
-def get_collection(uri:str, database_name:str, collection_name:str):
+def get_async_mongo_client(uri:str):
+    try:
+        return _get_or_create_client(uri, "async")
+    except Exception as e:
+        logging.info(f"Error connecting to the Mongo DB: {e}")
+
+def get_collection_name(collection_key:str) -> str:
+    return st.secrets.db_collections.get(collection_key, DEFAULT_COLLECTION_NAMES.get(collection_key))
+
+def use_transactions() -> bool:
+    try:
+        return bool(st.secrets.get("db_options", {}).get("use_transactions", False))
+    except Exception:
+        return False
+
+def get_read_profiles() -> dict:
+    profiles = {name: dict(profile) for name, profile in DEFAULT_READ_PROFILES.items()}
+
+    try:
+        for name, profile in st.secrets.get("db_read_profiles", {}).items():
+            if hasattr(profile, "items"):
+                profiles[name] = {**profiles.get(name, {}), **profile}
+    except Exception as e:
+        logging.info(f"Using the default read profiles: {e}")
+
+    return profiles
+
+def is_primary_mode(settings:dict) -> bool:
+    return read_pref_mode_from_name(settings.get("read_preference", "primary")) == read_pref_mode_from_name("primary")
+
+def get_max_staleness(settings:dict) -> float:
+    max_staleness = settings.get("max_staleness_seconds", -1)
+
+    if max_staleness is None or max_staleness < 0:
+        return None
+
+    # Drivers reject a bounded staleness under 90 seconds
+    return max(max_staleness, MIN_MAX_STALENESS_SECONDS)
+
+def get_read_options(profile:str) -> dict:
+    settings = get_read_profiles()[profile]
+    mode     = read_pref_mode_from_name(settings.get("read_preference", "primary"))
+    options  = {}
+
+    max_staleness = get_max_staleness(settings)
+
+    # Primary reads cannot have a bounded staleness
+    if is_primary_mode(settings) or max_staleness is None:
+        options["read_preference"] = make_read_preference(mode, None)
+    else:
+        options["read_preference"] = make_read_preference(mode, None, max_staleness=max_staleness)
+
+    if settings.get("read_concern"):
+        options["read_concern"] = ReadConcern(settings["read_concern"])
+
+    return options
+
+def get_min_post_accept_window() -> float:
+    settings = get_read_profiles()["analytics"]
+
+    if is_primary_mode(settings):
+        return 0.0
+
+    max_staleness = get_max_staleness(settings)
+
+    # Without a staleness bound a secondary can lag forever, so writers stay on the primary
+    if max_staleness is None:
+        return float("inf")
+
+    # The driver only learns a secondary's lag on each heartbeat, so it can pick one up to
+    # a heartbeat further behind than the staleness bound
+    return max_staleness + get_client_options().get("heartbeatFrequencyMS", DEFAULT_HEARTBEAT_MS) / 1000
+
+def get_post_accept_window() -> float:
+    try:
+        configured = float(st.secrets.get("db_read_profiles", {}).get("post_accept_window_seconds", 0))
+    except Exception:
+        configured = 0.0
+
+    return max(configured, get_min_post_accept_window())
+
+def mark_user_write(username:str):
+    with _user_writes_lock:
+        _user_writes[username] = time.monotonic()
+
+def get_read_profile(username:str) -> str:
+    with _user_writes_lock:
+        last_write = _user_writes.get(username)
+
+    if last_write is not None and time.monotonic() - last_write < get_post_accept_window():
+        return "post_accept"
+
+    return "analytics"
+
+def get_collection(uri:str, database_name:str, collection_name:str, profile:str = None):
     try:
         client     = get_mongo_client(uri)
         database   = client[database_name]
         collection = database[collection_name]
 
+        if profile is not None:
+            collection = collection.with_options(**get_read_options(profile))
+
         return collection
     except Exception as e:
-        logging.info(f"Error getting the collection from the Mongo DB: {e}")
\ No newline at end of file
+        logging.info(f"Error getting the collection from the Mongo DB: {e}")
+
+def get_async_collection(uri:str, database_name:str, collection_name:str):
+    try:
+        client     = get_async_mongo_client(uri)
+        database   = client[database_name]
+        collection = database[collection_name]
+
+        return collection
+    except Exception as e:
+        logging.info(f"Error getting the async collection from the Mongo DB: {e}")
+
+def get_pool_stats() -> list:
+    with _clients_lock:
+        entries = list(_clients.items())
+
+    pool_stats = []
+
+    for (uri, kind), entry in entries:
+        stats = entry["listener"].snapshot()
+        stats["kind"]          = kind
+        stats["host"]          = uri.split("@")[-1].split("/")[0]
+        stats["max_pool_size"] = entry["options"].get("maxPoolSize")
+        stats["min_pool_size"] = entry["options"].get("minPoolSize")
+
+        pool_stats.append(stats)
+
+    return pool_stats
+
+def close_clients():
+    with _clients_lock:
+        for entry in _clients.values():
+            entry["client"].close()
+
+        _clients.clear()
+
+def check_read_profiles(uri:str, database_name:str) -> dict:
+    database = get_mongo_client(uri)[database_name]
+    servers  = {}
+
+    for profile in get_read_profiles():
+        hello = database.command("hello", read_preference=get_read_options(profile)["read_preference"])
+
+        servers[profile] = {"server": hello.get("me"), "primary": hello.get("isWritablePrimary")}
+
+    return servers
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show which replica set member answers each read profile")
+    parser.parse_args()
+
+    for profile, server in check_read_profiles(st.secrets.db_credentials.uri, st.secrets.db_credentials.database_name).items():
+        logging.info(f"{profile}: {get_read_options(profile)} -> {server}")
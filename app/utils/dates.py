@@ -0,0 +1,106 @@
+import re
+import pytz
+import unicodedata
+import pandas as pd
+
+from datetime import datetime, timedelta
+
+TIMEZONE        = pytz.timezone("America/Mexico_City")
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Words whose date depends on the day the prompt is written
+RELATIVE_DATE_WORDS = {
+    "hoy", "ayer", "anteayer", "antier", "anoche", "manana", "hace", "pasado", "pasada", "anterior",
+    "proximo", "proxima", "semana", "mes", "lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"
+}
+
+PERIODS = ["day", "week", "month"]
+WINDOWS = ["current", "previous"]
+
+def get_now() -> datetime:
+    return datetime.now(tz=TIMEZONE).replace(tzinfo=None)
+
+def get_period_bounds(now: datetime = None) -> dict:
+    now = now or get_now()
+
+    day_start            = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start           = day_start - timedelta(days=day_start.weekday())
+    month_start          = day_start.replace(day=1)
+    previous_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    next_month_start     = (month_start + timedelta(days=32)).replace(day=1)
+
+    return {
+        ("day", "current"): (day_start, day_start + timedelta(days=1)),
+        ("day", "previous"): (day_start - timedelta(days=1), day_start),
+        ("week", "current"): (week_start, week_start + timedelta(days=7)),
+        ("week", "previous"): (week_start - timedelta(days=7), week_start),
+        ("month", "current"): (month_start, next_month_start),
+        ("month", "previous"): (previous_month_start, month_start)
+    }
+
+def parse_movement_datetime(value) -> datetime:
+    if value is None or isinstance(value, datetime):
+        return value
+
+    value = str(value).strip()
+
+    if not value:
+        return None
+
+    try:
+        return datetime.strptime(value, DATETIME_FORMAT)
+    except ValueError:
+        pass
+
+    # The LLM and the data editor also produce ISO strings, dates without a time or fractional seconds
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = pd.to_datetime(value).to_pydatetime()
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(TIMEZONE).replace(tzinfo=None)
+
+    return parsed
+
+def normalize_movement_datetime(value) -> str:
+    parsed = parse_movement_datetime(value)
+
+    return parsed.strftime(DATETIME_FORMAT) if parsed is not None else None
+
+def get_date_words(text: str) -> set:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(character for character in text if not unicodedata.combining(character))
+
+    return set(re.findall(r"\w+", text.casefold()))
+
+def has_relative_date(text: str) -> bool:
+    return not get_date_words(text).isdisjoint(RELATIVE_DATE_WORDS)
+
+def parse_datetimes(series: pd.Series) -> pd.Series:
+    # Movements hold BSON dates once migrated and "%Y-%m-%d %H:%M:%S" strings
+    # before, so readers accept both until every document is converted.
+    return pd.to_datetime(series, format="ISO8601")
+
+def get_datetime_range_query(start: datetime = None, end: datetime = None) -> dict:
+    date_range   = {}
+    string_range = {}
+
+    if start is not None:
+        date_range["$gte"]   = start
+        string_range["$gte"] = start.strftime(DATETIME_FORMAT)
+
+    if end is not None:
+        date_range["$lt"]   = end
+        string_range["$lt"] = end.strftime(DATETIME_FORMAT)
+
+    return {"$or": [{"datetime": date_range}, {"datetime": string_range}]}
+
+def get_datetime_expression(field: str = "$datetime") -> dict:
+    return {
+        "$cond": [
+            {"$eq": [{"$type": field}, "string"]},
+            {"$dateFromString": {"dateString": field, "format": DATETIME_FORMAT}},
+            field
+        ]
+    }
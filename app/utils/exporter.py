@@ -0,0 +1,93 @@
+import logging
+import tempfile
+import pandas as pd
+
+from typing import Callable, Iterator
+from utils.dates import DATETIME_FORMAT, parse_datetimes
+from utils.telemetry import timed
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_MAX_MEMORY = 16 * 1024 * 1024
+EXPORT_COLUMNS    = ["datetime", "name", "description", "movement_type", "amount", "source_name", "source_type", "category"]
+EXPORT_FORMATS    = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"}
+}
+
+def iter_movement_batches(finance_collection, query: dict, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    cursor = (
+        finance_collection.find(query, {"_id": 0, **{column: 1 for column in EXPORT_COLUMNS}})
+                          .sort([("datetime", -1), ("_id", -1)])
+                          .batch_size(batch_size)
+    )
+
+    batch = []
+
+    for movement in cursor:
+        batch.append(movement)
+
+        if len(batch) == batch_size:
+            yield get_export_frame(batch)
+            batch = []
+
+    if batch:
+        yield get_export_frame(batch)
+
+def get_export_frame(batch: list) -> pd.DataFrame:
+    frame = pd.DataFrame(batch).reindex(columns=EXPORT_COLUMNS)
+    frame["datetime"] = parse_datetimes(frame["datetime"])
+    frame["amount"]   = pd.to_numeric(frame["amount"], errors="coerce")
+
+    for column in EXPORT_COLUMNS:
+        if column not in ("datetime", "amount"):
+            frame[column] = frame[column].astype("string")
+
+    return frame
+
+def write_csv(batches: Iterator[pd.DataFrame], spool):
+    for index, frame in enumerate(batches):
+        frame.to_csv(spool, header=index == 0, index=False, encoding="utf-8", date_format=DATETIME_FORMAT)
+
+def write_parquet(batches: Iterator[pd.DataFrame], spool):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [("datetime", pa.timestamp("ms")), ("amount", pa.float64())] +
+        [(column, pa.string()) for column in EXPORT_COLUMNS if column not in ("datetime", "amount")]
+    )
+
+    with pq.ParquetWriter(spool, schema) as writer:
+        for frame in batches:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+
+@timed()
+def export_movements(finance_collection, query: dict, file_format: str, batch_size: int = EXPORT_BATCH_SIZE):
+    spool   = tempfile.SpooledTemporaryFile(max_size=EXPORT_MAX_MEMORY, mode="w+b")
+    batches = iter_movement_batches(finance_collection, query, batch_size)
+
+    if file_format == "Parquet":
+        write_parquet(batches, spool)
+    else:
+        write_csv(batches, spool)
+
+    spool.seek(0)
+
+    logging.info(f"Movements exported as {file_format}")
+
+    return spool
+
+def get_export_data(finance_collection, query: dict, file_format: str) -> Callable[[], bytes]:
+    # download_button runs the callable on click, the spool keeps the batches off the heap while
+    # they are written, but the finished file is handed to Streamlit as bytes
+    def read_export() -> bytes:
+        try:
+            with export_movements(finance_collection, query, file_format) as spool:
+                return spool.read()
+        except Exception as e:
+            logging.error(f"Error exporting the movements: {e}")
+            raise
+
+    return read_export
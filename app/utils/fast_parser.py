@@ -0,0 +1,164 @@
+import re
+import logging
+import threading
+import unicodedata
+
+from typing import List, Optional
+from utils.models import Movement, MovementType, SourceType
+from utils.dates import RELATIVE_DATE_WORDS
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+MOVEMENT_PATTERN = re.compile(
+    r"^(?P<name>.+?)\s+\$?\s*(?P<amount>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)"
+    r"(?:\s+(?:(?:con|en|de|desde|por|via|vía)\s+)?(?P<source>.+?))?\s*$",
+    re.IGNORECASE
+)
+
+# Commas only split when followed by a space so "1,250" stays one amount
+SEGMENT_SEPARATOR = re.compile(r"[;\n]|,\s+|\s+y\s+(?=\D)")
+
+MONTH_NAMES = {
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "setiembre", "octubre", "noviembre", "diciembre"
+}
+
+# Numbers, dates and times left in the name are details the pattern cannot place
+UNPLACED_TOKEN = re.compile(r"\d")
+
+INCOME_KEYWORDS = {"nomina", "sueldo", "salario", "ingreso", "deposito", "quincena", "bono", "reembolso", "aguinaldo"}
+
+SOURCE_TYPE_ALIASES = {
+    "efectivo": [SourceType.CASH],
+    "cash": [SourceType.CASH],
+    "debito": [SourceType.DEBIT_CARD],
+    "tarjeta de debito": [SourceType.DEBIT_CARD],
+    "credito": [SourceType.CREDIT_CARD],
+    "tarjeta de credito": [SourceType.CREDIT_CARD],
+    "tarjeta": [SourceType.DEBIT_CARD, SourceType.CREDIT_CARD],
+    "vale": [SourceType.VALE],
+    "vales": [SourceType.VALE]
+}
+
+_parser_lock  = threading.Lock()
+_parser_stats = {"attempts": 0, "parsed": 0}
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(character for character in text if not unicodedata.combining(character))
+
+    return " ".join(text.casefold().split())
+
+def match_source(source_text: Optional[str], sources: list) -> Optional[dict]:
+    sources = sources or []
+
+    if not source_text:
+        return sources[0] if len(sources) == 1 else None
+
+    source_text = normalize_text(source_text)
+
+    for source in sources:
+        if normalize_text(source["source_name"]) == source_text:
+            return source
+
+    source_types = [normalize_text(source_type.value) for source_type in SOURCE_TYPE_ALIASES.get(source_text, [])]
+    candidates   = [source for source in sources if normalize_text(source["source_type"]) in source_types]
+
+    return candidates[0] if len(candidates) == 1 else None
+
+def to_source_type(value: str) -> Optional[SourceType]:
+    for source_type in SourceType:
+        if normalize_text(source_type.value) == normalize_text(value):
+            return source_type
+
+    return None
+
+def match_category(name: str, categories: list) -> Optional[str]:
+    normalized_categories = {normalize_text(category): category for category in categories or []}
+    name                  = normalize_text(name)
+
+    if name in normalized_categories:
+        return normalized_categories[name]
+
+    matches = {normalized_categories[token] for token in name.split() if token in normalized_categories}
+
+    return matches.pop() if len(matches) == 1 else None
+
+def has_unplaced_tokens(name: str) -> bool:
+    tokens = normalize_text(name).split()
+
+    return any(token in RELATIVE_DATE_WORDS or token in MONTH_NAMES or UNPLACED_TOKEN.search(token) for token in tokens)
+
+def _parse(prompt: str, sources: list, categories: list) -> Optional[Movement]:
+    match = MOVEMENT_PATTERN.match(prompt.strip())
+
+    if match is None:
+        return None
+
+    name = match.group("name").strip()
+
+    # Dates and extra numbers need the LLM, a local parse would store them as today's movement
+    if has_unplaced_tokens(name):
+        return None
+
+    source = match_source(match.group("source"), sources)
+
+    source_type = to_source_type(source["source_type"]) if source else None
+
+    if source_type is None:
+        return None
+
+    if set(normalize_text(name).split()) & INCOME_KEYWORDS:
+        movement_type = MovementType.INCOME
+        category      = MovementType.INCOME.value.upper()
+    else:
+        movement_type = MovementType.EXPENSE
+        category      = match_category(name, categories)
+
+    if category is None:
+        return None
+
+    return Movement(
+        name=name.capitalize(),
+        description=prompt.strip(),
+        movement_type=movement_type,
+        amount=float(match.group("amount").replace(",", "")),
+        source_name=source["source_name"],
+        source_type=source_type,
+        category=category
+    )
+
+@timed()
+def parse_movements(prompt: str, sources: list, categories: list) -> Optional[List[Movement]]:
+    segments  = [segment for segment in SEGMENT_SEPARATOR.split(prompt) if segment.strip()]
+    movements = []
+
+    try:
+        for segment in segments:
+            movement = _parse(segment, sources, categories)
+
+            if movement is None:
+                movements = None
+                break
+
+            movements.append(movement)
+    except Exception as e:
+        logging.error(f"Error parsing the movements locally: {e}")
+        record_error()
+        movements = None
+
+    with _parser_lock:
+        _parser_stats["attempts"] += 1
+
+        if movements:
+            _parser_stats["parsed"] += 1
+
+    return movements or None
+
+def get_fast_parser_stats() -> dict:
+    with _parser_lock:
+        stats = dict(_parser_stats)
+
+    stats["coverage"] = stats["parsed"] / stats["attempts"] if stats["attempts"] else 0.0
+
+    return stats
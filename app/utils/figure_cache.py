@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+from utils.models import MovementType
+from utils.plotter import (get_total_movements_by_month, plot_pie_movement_by_category, plot_total_movements_by_month,
+                           plot_line_total_movements_by_month, plot_bar_movement_by_source_name)
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+FIGURE_CACHE_SIZE    = 256
+AGGREGATE_CACHE_SIZE = 128
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries  = OrderedDict()
+        self.lock     = threading.Lock()
+        self.stats    = {"hits": 0, "misses": 0}
+
+    def get_or_build(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+
+                return self.entries[key]
+
+            self.stats["misses"] += 1
+
+        value = build()
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return value
+
+_figure_cache    = LRUCache(FIGURE_CACHE_SIZE)
+_aggregate_cache = LRUCache(AGGREGATE_CACHE_SIZE)
+
+def get_data_version(movements: pd.DataFrame) -> str:
+    if movements is None or movements.empty:
+        return "empty"
+
+    row_hashes = pd.util.hash_pandas_object(movements, index=False).to_numpy()
+
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+def get_monthly_totals(username: str, version: str, movements: pd.DataFrame, movement_type: MovementType) -> pd.DataFrame:
+    return _aggregate_cache.get_or_build(
+        (username, version, "total_by_month", movement_type.value),
+        lambda: get_total_movements_by_month(movements, movement_type)
+    )
+
+CHART_BUILDERS = {
+    "pie_by_category": lambda username, version, movements, movement_type: plot_pie_movement_by_category(movements, movement_type),
+    "bar_by_month": lambda username, version, movements, movement_type: plot_total_movements_by_month(
+        movements, movement_type, get_monthly_totals(username, version, movements, movement_type)
+    ),
+    "line_by_month": lambda username, version, movements, movement_type: plot_line_total_movements_by_month(
+        movements, movement_type, get_monthly_totals(username, version, movements, movement_type)
+    ),
+    "bar_by_source_name": lambda username, version, movements, movement_type: plot_bar_movement_by_source_name(movements, movement_type)
+}
+
+def get_figure(username: str, version: str, chart_kind: str, movement_type: MovementType, movements: pd.DataFrame):
+    return _figure_cache.get_or_build(
+        (username, version, chart_kind, movement_type.value),
+        lambda: CHART_BUILDERS[chart_kind](username, version, movements, movement_type)
+    )
+
+def get_figure_cache_stats() -> dict:
+    return {
+        "figures": dict(_figure_cache.stats, size=len(_figure_cache.entries)),
+        "aggregates": dict(_aggregate_cache.stats, size=len(_aggregate_cache.entries))
+    }
@@ -0,0 +1,257 @@
+import re
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from typing import Callable, Iterator
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from collections import Counter
+from utils.models import MovementType
+from utils.database import get_collection, get_collection_name, mark_user_write
+from utils.rollups import ROLLUP_KEY_FIELDS
+from utils.telemetry import timed
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+IMPORT_CHUNK_SIZE = 5000
+DEFAULT_CATEGORY  = "OTROS"
+IMPORT_COLUMNS    = ["datetime", "amount", "name", "description", "category"]
+
+DUPLICATE_KEY_ERROR = 11000
+
+OFX_TRANSACTION_PATTERN = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+OFX_FIELD_PATTERN       = re.compile(r"<(DTPOSTED|TRNAMT|FITID|NAME|MEMO)>([^<\r\n]*)", re.IGNORECASE)
+
+def get_database_collection(collection_key: str):
+    return get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        get_collection_name(collection_key)
+    )
+
+def iter_csv_chunks(file, column_map: dict, chunksize: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    column_map = {field: column for field, column in column_map.items() if column}
+    renames    = {column: field for field, column in column_map.items()}
+
+    for chunk in pd.read_csv(file, usecols=list(column_map.values()), dtype=str, chunksize=chunksize):
+        yield chunk.rename(columns=renames)
+
+def iter_ofx_chunks(file, chunksize: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    buffer = ""
+    rows   = []
+
+    for line in file:
+        buffer += line.decode("latin-1") if isinstance(line, bytes) else line
+
+        # Only the unfinished transaction stays in the buffer
+        last_end = 0
+
+        for match in OFX_TRANSACTION_PATTERN.finditer(buffer):
+            fields = {key.upper(): value.strip() for key, value in OFX_FIELD_PATTERN.findall(match.group(1))}
+            rows.append(
+                {
+                    "datetime": fields.get("DTPOSTED", "")[:14].ljust(14, "0"),
+                    "amount": fields.get("TRNAMT"),
+                    "fitid": fields.get("FITID"),
+                    "name": fields.get("NAME") or fields.get("MEMO"),
+                    "description": fields.get("MEMO") or fields.get("NAME")
+                }
+            )
+            last_end = match.end()
+
+        buffer = buffer[last_end:]
+
+        if len(rows) >= chunksize:
+            yield pd.DataFrame(rows)
+            rows = []
+
+    if rows:
+        yield pd.DataFrame(rows)
+
+def get_import_keys(chunk: pd.DataFrame, source: dict, occurrences: Counter) -> pd.Series:
+    # OFX statements carry a FITID per transaction, CSV rows are keyed by their content and how
+    # many identical rows came before, so two equal purchases on one day stay two movements
+    keys = []
+
+    for row in chunk.drop(columns="fitid", errors="ignore").astype(str).itertuples(index=False, name=None):
+        occurrences[row] += 1
+        keys.append([*row, occurrences[row]])
+
+    if "fitid" in chunk:
+        keys = [[fitid] if isinstance(fitid, str) and fitid else key for fitid, key in zip(chunk["fitid"], keys)]
+
+    return pd.Series(
+        [
+            hashlib.sha256(json.dumps([source["source_name"], source["source_type"], *key]).encode("utf-8")).hexdigest()
+            for key in keys
+        ],
+        index=chunk.index
+    )
+
+def get_failed_inserts(error: BulkWriteError) -> dict:
+    return {write_error["index"]: write_error["code"] for write_error in error.details.get("writeErrors", [])}
+
+def normalize_chunk(chunk: pd.DataFrame, source: dict, categories: list, date_format: str = None) -> pd.DataFrame:
+    chunk = chunk.reindex(columns=IMPORT_COLUMNS)
+
+    movements = pd.DataFrame(index=chunk.index)
+    movements["datetime"] = pd.to_datetime(chunk["datetime"], format=date_format, errors="coerce")
+    movements["amount"]   = pd.to_numeric(
+        chunk["amount"].astype(str).str.replace(r"[$,\s]", "", regex=True),
+        errors="coerce"
+    )
+
+    movements = movements[movements["datetime"].notna() & movements["amount"].notna() & (movements["amount"] != 0)]
+    chunk     = chunk.loc[movements.index]
+
+    is_expense = movements["amount"] < 0
+    names      = chunk["name"].fillna("").str.strip().str.slice(0, 80)
+
+    known_categories = {category.upper() for category in categories or []}
+    categories       = chunk["category"].fillna(names).str.strip().str.upper()
+
+    movements["name"]          = names
+    movements["description"]   = chunk["description"].fillna(names).str.strip()
+    movements["movement_type"] = np.where(is_expense, MovementType.EXPENSE.value, MovementType.INCOME.value)
+    movements["amount"]        = movements["amount"].abs()
+    movements["source_name"]   = source["source_name"]
+    movements["source_type"]   = source["source_type"]
+    movements["category"]      = np.where(
+        is_expense,
+        categories.where(categories.isin(known_categories) | chunk["category"].notna(), DEFAULT_CATEGORY),
+        MovementType.INCOME.value.upper()
+    )
+
+    return movements
+
+def get_chunk_rollup_updates(movements: pd.DataFrame, username: str) -> list:
+    grouped = (
+        movements.assign(username=username, year=movements["datetime"].dt.year, month=movements["datetime"].dt.month)
+                 .groupby(ROLLUP_KEY_FIELDS)["amount"]
+                 .agg(["sum", "count"])
+                 .reset_index()
+    )
+
+    return [
+        UpdateOne(
+            {field: row[field] for field in ROLLUP_KEY_FIELDS},
+            {"$inc": {"amount": row["sum"], "count": row["count"]}, "$currentDate": {"updated_at": True}},
+            upsert=True
+        )
+        for row in grouped.to_dict(orient="records")
+    ]
+
+@timed()
+def import_statement(chunks: Iterator[pd.DataFrame], username: str, source: dict, categories: list,
+                     date_format: str = None, on_progress: Callable[[int], None] = None) -> dict:
+    finance_collection    = get_database_collection("finance_collection_name")
+    categories_collection = get_database_collection("categories_collection_name")
+    rollups_collection    = get_database_collection("rollups_collection_name")
+    sources_collection    = get_database_collection("sources_collection_name")
+
+    categories      = list(categories or [])
+    summary         = {"imported": 0, "skipped": 0, "duplicates": 0, "balance_delta": 0.0}
+    occurrences     = Counter()
+    oldest_datetime = None
+
+    # Reconciliation leaves the source alone while the imported rows are ahead of its balance
+    sources_collection.update_one(get_source_filter(username, source), {"$inc": {"pending_imports": 1}})
+
+    try:
+        for chunk in chunks:
+            import_keys = get_import_keys(chunk, source, occurrences)
+            movements   = normalize_chunk(chunk, source, categories, date_format)
+
+            summary["skipped"] += len(chunk) - len(movements)
+
+            if movements.empty:
+                continue
+
+            movements["import_key"] = import_keys.loc[movements.index]
+
+            documents = movements.assign(username=username).to_dict(orient="records")
+            failed    = {}
+            error     = None
+
+            try:
+                finance_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                failed = get_failed_inserts(e)
+
+                # Rows of an earlier import of the same statement are skipped, any other error still stops the import
+                if any(code != DUPLICATE_KEY_ERROR for code in failed.values()):
+                    error = e
+
+            summary["duplicates"] += sum(code == DUPLICATE_KEY_ERROR for code in failed.values())
+            movements              = movements[[index not in failed for index in range(len(movements))]]
+
+            # The ledger already holds these rows, the balance follows them even if a later step stops the import
+            if not movements.empty:
+                chunk_oldest    = movements["datetime"].min().to_pydatetime()
+                oldest_datetime = min(oldest_datetime or chunk_oldest, chunk_oldest)
+
+                summary["imported"]      += len(movements)
+                summary["balance_delta"] += get_balance_delta(movements)
+
+            if error is not None:
+                raise error
+
+            if movements.empty:
+                continue
+
+            new_categories = sorted(
+                set(movements.loc[movements["movement_type"] == MovementType.EXPENSE.value, "category"]) - set(categories)
+            )
+
+            if new_categories:
+                categories_collection.update_one(
+                    {"username": username},
+                    {"$addToSet": {"categories": {"$each": new_categories}}},
+                    upsert=True
+                )
+
+                categories = list(categories) + new_categories
+
+            rollups_collection.bulk_write(get_chunk_rollup_updates(movements, username), ordered=False)
+
+            if on_progress is not None:
+                on_progress(summary["imported"])
+    finally:
+        # Also runs when a rerun or an error stops the import part-way, so the balance and the
+        # checkpoints match the chunks that were written
+        finish_import(sources_collection, username, source, summary["balance_delta"], oldest_datetime)
+
+    logging.info(f"Statement imported for {username}: {summary}")
+
+    return summary
+
+def get_balance_delta(movements: pd.DataFrame) -> float:
+    signed_amounts = np.where(movements["movement_type"] == MovementType.EXPENSE.value, -movements["amount"], movements["amount"])
+
+    return float(signed_amounts.sum())
+
+def get_source_filter(username: str, source: dict) -> dict:
+    return {
+        "username": username,
+        "source_name": source["source_name"],
+        "source_type": source["source_type"]
+    }
+
+def finish_import(sources_collection, username: str, source: dict, balance_delta: float, oldest_datetime):
+    # The checkpoint epoch moves after every row is in and before the checkpoints go, see create_checkpoints
+    sources_collection.update_one(
+        get_source_filter(username, source),
+        {"$inc": {"source_balance": balance_delta, "pending_imports": -1, "checkpoint_epoch": int(oldest_datetime is not None)}}
+    )
+
+    if oldest_datetime is not None:
+        # Statements are back-dated, so the checkpoints after the first imported movement are stale
+        get_database_collection("checkpoints_collection_name").delete_many(
+            {**get_source_filter(username, source), "as_of": {"$gt": oldest_datetime}}
+        )
+
+    mark_user_write(username)
@@ -0,0 +1,224 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+import streamlit as st
+
+from datetime import datetime
+from pymongo import UpdateOne
+from collections import OrderedDict
+from utils.dates import has_relative_date
+from utils.database import get_collection, get_collection_name
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+DEFAULT_MAX_ENTRIES    = 5000
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_HIT_FLUSH_SIZE = 50
+DEFAULT_HIT_FLUSH_SECS = 60
+
+_memory_cache = OrderedDict()
+_pending_hits = {}
+_cache_lock   = threading.Lock()
+_cache_stats  = {"hits": 0, "misses": 0, "memory_hits": 0, "evictions": 0, "uncacheable": 0}
+_flush_state  = {"last_flush": time.monotonic()}
+
+def get_cache_settings() -> dict:
+    settings = {
+        "max_entries": DEFAULT_MAX_ENTRIES,
+        "memory_entries": DEFAULT_MEMORY_ENTRIES,
+        "hit_flush_size": DEFAULT_HIT_FLUSH_SIZE,
+        "hit_flush_seconds": DEFAULT_HIT_FLUSH_SECS
+    }
+
+    try:
+        settings.update(st.secrets.get("llm_cache", {}))
+    except Exception as e:
+        logging.info(f"Using the default LLM cache settings: {e}")
+
+    return settings
+
+def get_llm_cache_collection():
+    return get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        get_collection_name("llm_cache_collection_name")
+    )
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", prompt).casefold().split())
+
+def get_sources_hash(sources: list) -> str:
+    source_keys = sorted(
+        (source.get("source_name", "").upper(), str(source.get("source_type", "")))
+        for source in sources or []
+    )
+
+    return hashlib.sha256(json.dumps(source_keys).encode("utf-8")).hexdigest()
+
+def get_cache_key(prompt: str, sources: list) -> str:
+    key = f"{normalize_prompt(prompt)}\n{get_sources_hash(sources)}"
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _increment_stat(key: str, value: int = 1):
+    with _cache_lock:
+        _cache_stats[key] += value
+
+def is_cacheable(prompt: str) -> bool:
+    # A cached answer replays the date the LLM resolved the first time, so "ayer" would stay on that day
+    return not has_relative_date(prompt)
+
+def _record_memory_hit(key: str):
+    pending = _pending_hits.setdefault(key, {"hits": 0, "last_used_at": None})
+
+    pending["hits"]        += 1
+    pending["last_used_at"] = datetime.now()
+
+def _should_flush_hits() -> bool:
+    settings = get_cache_settings()
+
+    with _cache_lock:
+        pending_hits = sum(pending["hits"] for pending in _pending_hits.values())
+
+    return pending_hits >= settings["hit_flush_size"] or \
+           (pending_hits and time.monotonic() - _flush_state["last_flush"] >= settings["hit_flush_seconds"])
+
+def flush_memory_hits(llm_cache_collection=None):
+    with _cache_lock:
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+        _flush_state["last_flush"] = time.monotonic()
+
+    if not pending:
+        return
+
+    try:
+        (llm_cache_collection or get_llm_cache_collection()).bulk_write(
+            [
+                UpdateOne(
+                    {"_id": key},
+                    {"$inc": {"hits": entry["hits"]}, "$max": {"last_used_at": entry["last_used_at"]}}
+                )
+                for key, entry in pending.items()
+            ],
+            ordered=False
+        )
+    except Exception as e:
+        logging.error(f"Error recording the LLM cache memory hits: {e}")
+        record_error()
+
+def _remember(key: str, movements_data):
+    with _cache_lock:
+        _memory_cache[key] = movements_data
+        _memory_cache.move_to_end(key)
+
+        while len(_memory_cache) > get_cache_settings()["memory_entries"]:
+            _memory_cache.popitem(last=False)
+
+@timed()
+def get_cached_movements(prompt: str, sources: list):
+    if not is_cacheable(prompt):
+        _increment_stat("uncacheable")
+        return None
+
+    key = get_cache_key(prompt, sources)
+
+    with _cache_lock:
+        movements_data = _memory_cache.get(key)
+
+        if movements_data is not None:
+            _memory_cache.move_to_end(key)
+            _cache_stats["hits"]        += 1
+            _cache_stats["memory_hits"] += 1
+
+            # Memory hits reach Mongo in batches so eviction still sees the hot prompts as recently used
+            _record_memory_hit(key)
+
+    if movements_data is not None:
+        if _should_flush_hits():
+            flush_memory_hits()
+
+        return json.loads(json.dumps(movements_data))
+
+    try:
+        document = get_llm_cache_collection().find_one_and_update(
+            {"_id": key},
+            {
+                "$inc": {"hits": 1},
+                "$set": {"last_used_at": datetime.now()}
+            }
+        )
+    except Exception as e:
+        logging.error(f"Error reading the LLM cache: {e}")
+        record_error()
+        document = None
+
+    if document is None:
+        _increment_stat("misses")
+        return None
+
+    _increment_stat("hits")
+    _remember(key, document["movement"])
+
+    return document["movement"]
+
+@timed()
+def set_cached_movements(prompt: str, sources: list, movements_data: list):
+    if not is_cacheable(prompt):
+        return
+
+    key = get_cache_key(prompt, sources)
+
+    _remember(key, movements_data)
+
+    try:
+        llm_cache_collection = get_llm_cache_collection()
+
+        llm_cache_collection.update_one(
+            {"_id": key},
+            {
+                "$set": {
+                    "movement": movements_data,
+                    "last_used_at": datetime.now()
+                },
+                "$setOnInsert": {
+                    "hits": 0,
+                    "created_at": datetime.now()
+                }
+            },
+            upsert=True
+        )
+
+        flush_memory_hits(llm_cache_collection)
+        evict_entries(llm_cache_collection, get_cache_settings()["max_entries"])
+    except Exception as e:
+        logging.error(f"Error writing the LLM cache: {e}")
+        record_error()
+
+def evict_entries(llm_cache_collection, max_entries: int):
+    overflow = llm_cache_collection.estimated_document_count() - max_entries
+
+    if overflow <= 0:
+        return
+
+    stale_keys = [
+        document["_id"]
+        for document in llm_cache_collection.find({}, {"_id": 1}).sort("last_used_at", 1).limit(overflow)
+    ]
+
+    result = llm_cache_collection.delete_many({"_id": {"$in": stale_keys}})
+
+    _increment_stat("evictions", result.deleted_count)
+
+def get_cache_stats() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_stats)
+
+    lookups           = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+    return stats
@@ -0,0 +1,158 @@
+import logging
+import threading
+import streamlit as st
+
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from utils.dates import DATETIME_FORMAT
+from utils.rollups import ROLLUP_KEY_FIELDS, rebuild_rollups
+from utils.reconciliation import backfill_opening_balances
+from utils.users import split_config_credentials
+from utils.database import get_mongo_client, get_collection_name
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+INDEXES = {
+    "finance_collection_name": [
+        {"keys": [("username", ASCENDING), ("datetime", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("username", ASCENDING), ("_id", ASCENDING)]},
+        {"keys": [("username", ASCENDING), ("source_name", ASCENDING), ("source_type", ASCENDING), ("datetime", ASCENDING)]},
+        {
+            "keys": [("username", ASCENDING), ("import_key", ASCENDING)],
+            "unique": True,
+            "options": {"partialFilterExpression": {"import_key": {"$exists": True}}}
+        }
+    ],
+    "sources_collection_name": [
+        {"keys": [("username", ASCENDING), ("source_name", ASCENDING), ("source_type", ASCENDING)]}
+    ],
+    "categories_collection_name": [
+        {"keys": [("username", ASCENDING)]}
+    ],
+    "rollups_collection_name": [
+        {"keys": [(field, ASCENDING) for field in ROLLUP_KEY_FIELDS], "unique": True}
+    ],
+    "llm_cache_collection_name": [
+        {"keys": [("last_used_at", ASCENDING)]}
+    ],
+    "users_collection_name": [
+        {"keys": [("username", ASCENDING)], "unique": True}
+    ],
+    "checkpoints_collection_name": [
+        {"keys": [("username", ASCENDING), ("source_name", ASCENDING), ("source_type", ASCENDING), ("as_of", DESCENDING)], "unique": True}
+    ]
+}
+
+_indexes_lock         = threading.Lock()
+_indexes_bootstrapped = False
+
+def get_database():
+    return get_mongo_client(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name]
+
+def get_migrations_collection(database):
+    return database[get_collection_name("migrations_collection_name")]
+
+def ensure_indexes(database):
+    global _indexes_bootstrapped
+
+    with _indexes_lock:
+        if _indexes_bootstrapped:
+            return
+
+        for collection_key, indexes in INDEXES.items():
+            collection_name = get_collection_name(collection_key)
+
+            if collection_name is None:
+                continue
+
+            for index in indexes:
+                try:
+                    database[collection_name].create_index(index["keys"], unique=index.get("unique", False), **index.get("options", {}))
+                except Exception as e:
+                    logging.error(f"Error creating the index {index['keys']} on {collection_name}: {e}")
+
+        _indexes_bootstrapped = True
+
+        logging.info("Indexes bootstrapped")
+
+def convert_movement_datetimes(database):
+    finance_collection = database[st.secrets.db_collections.finance_collection_name]
+
+    result = finance_collection.update_many(
+        {"datetime": {"$type": "string"}},
+        [
+            {
+                "$set": {
+                    "datetime": {
+                        "$dateFromString": {
+                            "dateString": "$datetime",
+                            "format": DATETIME_FORMAT,
+                            "onError": "$datetime"
+                        }
+                    }
+                }
+            }
+        ]
+    )
+
+    logging.info(f"Converted {result.modified_count} movement datetimes to BSON dates")
+
+def backfill_source_opening_balances(database):
+    backfill_opening_balances(
+        database[st.secrets.db_collections.finance_collection_name],
+        database[st.secrets.db_collections.sources_collection_name]
+    )
+
+def drop_source_movements_index(database):
+    # The balance history also ranges over datetime, the index that stopped at source_type is a prefix of the new one
+    finance_collection = database[st.secrets.db_collections.finance_collection_name]
+    index_name         = "username_1_source_name_1_source_type_1"
+
+    if index_name in finance_collection.index_information():
+        finance_collection.drop_index(index_name)
+
+        logging.info(f"Dropped the {index_name} index")
+
+def bootstrap_rollups(database):
+    # The Dashboard trusts any rollup it finds, so the history before the first incremental write has to be there
+    rebuilt = rebuild_rollups(
+        database[st.secrets.db_collections.finance_collection_name],
+        database[st.secrets.db_collections.rollups_collection_name]
+    )
+
+    if not rebuilt:
+        raise RuntimeError("The rollups could not be rebuilt")
+
+MIGRATIONS = [
+    (1, "Convert movement datetimes to BSON dates", convert_movement_datetimes),
+    (2, "Backfill source opening balances", backfill_source_opening_balances),
+    (3, "Split the auth credentials into per-user documents", split_config_credentials),
+    (4, "Drop the source movements index without datetime", drop_source_movements_index),
+    (5, "Build the monthly rollups of every existing movement", bootstrap_rollups)
+]
+
+def run_migrations(database):
+    migrations_collection = get_migrations_collection(database)
+    applied_versions      = {migration["version"] for migration in migrations_collection.find({}, {"version": 1})}
+
+    for version, name, migration in MIGRATIONS:
+        if version in applied_versions:
+            continue
+
+        logging.info(f"Applying migration {version}: {name}")
+
+        migration(database)
+
+        migrations_collection.insert_one(
+            {
+                "version": version,
+                "name": name,
+                "applied_at": datetime.now()
+            }
+        )
+
+if __name__ == "__main__":
+    database = get_database()
+
+    ensure_indexes(database)
+    run_migrations(database)
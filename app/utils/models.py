@@ -1,6 +1,7 @@
 from enum import Enum
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from utils.dates import normalize_movement_datetime
 
 class SourceType(str, Enum):
     CASH        = "Efectivo"
@@ -21,3 +22,15 @@ class Movement(BaseModel):
     source_type: SourceType     = Field("Efectivo", description="Tipo de fuente de donde proviene el dinero")
     category: str               = Field(description="Categoria del movimiento")
     datetime: Optional[str]     = Field(None, description="Fecha y hora del movimiento (YYYY-MM-DD HH:MM:SS) si la proporciona el usuario")
+
+    @field_validator("datetime", mode="before")
+    @classmethod
+    def normalize_datetime(cls, value):
+        # Unparseable dates fail here instead of in the middle of the accept writes
+        try:
+            return normalize_movement_datetime(value)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Fecha y hora no válida: {value}") from e
+
+class Movements(BaseModel):
+    movements: List[Movement] = Field(description="Lista de todos los movimientos mencionados por el usuario")
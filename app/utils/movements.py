@@ -0,0 +1,154 @@
+import logging
+import pandas as pd
+import streamlit as st
+
+from bson import ObjectId
+from utils.dates import parse_datetimes, get_datetime_range_query
+from utils.database import get_collection, get_read_profile
+from utils.telemetry import timed, record_error
+from datetime import date, datetime, time, timedelta
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+# ObjectIds are generated by each client, so ids from different processes can
+# arrive slightly out of order. Re-read a small overlap window on every delta.
+ID_CLOCK_SKEW = timedelta(seconds=5)
+
+MOVEMENTS_COLUMNS    = ["datetime", "name", "movement_type", "amount", "source_name", "source_type", "category"]
+CATEGORICAL_COLUMNS  = ["movement_type", "source_name", "source_type", "category"]
+MOVEMENTS_PROJECTION = {"_id": 1, **{column: 1 for column in MOVEMENTS_COLUMNS}}
+
+HISTORY_PAGE_SIZE  = 50
+HISTORY_PROJECTION = {"username": 0, "import_key": 0}
+
+def get_finance_collection(profile: str = None):
+    return get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        st.secrets.db_collections.finance_collection_name,
+        profile
+    )
+
+def _get_movements_cache() -> dict:
+    if "movements_cache" not in st.session_state:
+        st.session_state.movements_cache = {}
+
+    return st.session_state.movements_cache
+
+def fetch_movements_since(finance_collection, username: str, last_id: ObjectId = None) -> list:
+    query = {"username": username}
+
+    if last_id is not None:
+        query["_id"] = {"$gt": ObjectId.from_datetime(last_id.generation_time - ID_CLOCK_SKEW)}
+
+    return list(finance_collection.find(query, MOVEMENTS_PROJECTION).sort("_id", 1))
+
+def compact_movements(movements: pd.DataFrame) -> pd.DataFrame:
+    movements = movements.reindex(columns=MOVEMENTS_COLUMNS)
+
+    movements["datetime"] = parse_datetimes(movements["datetime"])
+    movements["amount"]   = pd.to_numeric(movements["amount"], errors="coerce").astype("float64")
+
+    for column in CATEGORICAL_COLUMNS:
+        movements[column] = movements[column].astype("category")
+
+    return movements
+
+@timed()
+def load_movements(username: str) -> pd.DataFrame:
+    try:
+        cache = _get_movements_cache()
+        entry = cache.get(username)
+
+        if entry is None:
+            entry = {"frame": compact_movements(pd.DataFrame()), "last_id": None, "recent_ids": set()}
+
+        fetched       = fetch_movements_since(get_finance_collection(get_read_profile(username)), username, entry["last_id"])
+        new_movements = [movement for movement in fetched if movement["_id"] not in entry["recent_ids"]]
+
+        if fetched:
+            entry["last_id"]    = fetched[-1]["_id"]
+            window_start        = entry["last_id"].generation_time - ID_CLOCK_SKEW
+            entry["recent_ids"] = {
+                movement_id for movement_id in entry["recent_ids"] | {movement["_id"] for movement in fetched}
+                if movement_id.generation_time >= window_start
+            }
+
+        if new_movements:
+            new_frame      = compact_movements(pd.DataFrame(new_movements))
+            entry["frame"] = compact_movements(pd.concat([entry["frame"], new_frame], ignore_index=True))
+
+            logging.info(f"Loaded {len(new_movements)} new movements for {username}")
+
+        cache[username] = entry
+
+        # The cached frame is shared between reruns, callers must not modify it
+        return entry["frame"]
+    except Exception as e:
+        logging.error(f"Error loading the movements: {e}")
+        record_error()
+        return None
+
+def invalidate_movements(username: str):
+    _get_movements_cache().pop(username, None)
+
+def build_history_query(username: str, category: str = None, source_name: str = None, movement_type: str = None,
+                        source_type: str = None, init_date: date = None, end_date: date = None) -> dict:
+    query = {"username": username}
+
+    for field, value in [("category", category), ("source_name", source_name),
+                         ("movement_type", movement_type), ("source_type", source_type)]:
+        if value:
+            query[field] = value
+
+    if init_date or end_date:
+        query.update(
+            get_datetime_range_query(
+                datetime.combine(init_date, time.min) if init_date else None,
+                datetime.combine(end_date + timedelta(days=1), time.min) if end_date else None
+            )
+        )
+
+    return query
+
+@timed()
+def get_history_page(finance_collection, query: dict, after: tuple = None, page_size: int = HISTORY_PAGE_SIZE) -> tuple:
+    if after is not None:
+        last_datetime, last_id = after
+
+        after_key = [
+            {"datetime": {"$lt": last_datetime}},
+            {"datetime": last_datetime, "_id": {"$lt": last_id}}
+        ]
+
+        # Legacy string datetimes sort after every BSON date in descending order
+        if isinstance(last_datetime, datetime):
+            after_key.append({"datetime": {"$type": "string"}})
+
+        query = {"$and": [query, {"$or": after_key}]}
+
+    movements = list(
+        finance_collection.find(query, HISTORY_PROJECTION)
+                          .sort([("datetime", -1), ("_id", -1)])
+                          .limit(page_size + 1)
+    )
+
+    has_next  = len(movements) > page_size
+    movements = movements[:page_size]
+    next_key  = (movements[-1]["datetime"], movements[-1]["_id"]) if has_next else None
+
+    return movements, next_key
+
+@timed()
+def get_distinct_values(finance_collection, username: str, field: str) -> list:
+    return sorted(value for value in finance_collection.distinct(field, {"username": username}) if value is not None)
+
+@timed()
+def get_datetime_range(finance_collection, username: str) -> tuple:
+    first = finance_collection.find_one({"username": username}, {"datetime": 1}, sort=[("datetime", 1)])
+    last  = finance_collection.find_one({"username": username}, {"datetime": 1}, sort=[("datetime", -1)])
+
+    if first is None or last is None:
+        return None, None
+
+    return first["datetime"], last["datetime"]
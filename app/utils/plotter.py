@@ -1,29 +1,39 @@
 import logging
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
 from datetime import datetime
 from utils.models import MovementType
+from utils.dates import get_period_bounds, parse_datetimes
+from utils.telemetry import timed, record_error
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
+@timed()
 def get_total_movements_by_month(df: pd.DataFrame, movement_type:MovementType) -> pd.DataFrame:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
-        df["month"] = df["datetime"].dt.month
-        df["year"]  = df["datetime"].dt.year
+        movements = df[df["movement_type"] == movement_type]
 
-        total_expenses_by_month = df[df["movement_type"] == movement_type].groupby(["year", "month"])["amount"].sum().reset_index()
+        if "datetime" in movements.columns:
+            movement_datetimes = parse_datetimes(movements["datetime"])
+            group_keys         = [movement_datetimes.dt.year.rename("year"), movement_datetimes.dt.month.rename("month")]
+        else:
+            group_keys = ["year", "month"]
+
+        total_expenses_by_month = movements.groupby(group_keys)["amount"].sum().reset_index()
         total_expenses_by_month["month"] = total_expenses_by_month["month"].apply(lambda x: pd.to_datetime(str(x), format="%m").strftime("%B"))
 
         return total_expenses_by_month
     except Exception as e:
         logging.error(f"Error getting the total expenses by month: {e}")
+        record_error()
         return None
 
+@timed()
 def get_current_week_movements(df: pd.DataFrame, movement_type:MovementType) -> float:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
+        df["datetime"] = parse_datetimes(df["datetime"])
         current_year  = datetime.now().year
         current_month = datetime.now().month
         current_week  = datetime.now().isocalendar()[1]
@@ -36,11 +46,13 @@ def get_current_week_movements(df: pd.DataFrame, movement_type:MovementType) ->
         return current_week_expenses
     except Exception as e:
         logging.error(f"Error getting the current week expenses: {e}")
+        record_error()
         return 0.0
 
+@timed()
 def get_last_week_movements(df: pd.DataFrame, movement_type:MovementType) -> float:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
+        df["datetime"] = parse_datetimes(df["datetime"])
         last_week = datetime.now().isocalendar()[1] - 1
 
         if last_week == 0:
@@ -51,11 +63,13 @@ def get_last_week_movements(df: pd.DataFrame, movement_type:MovementType) -> flo
         return last_week_expenses
     except Exception as e:
         logging.error(f"Error getting the last week expenses: {e}")
+        record_error()
         return 0.0
 
+@timed()
 def get_current_day_movements(df: pd.DataFrame, movement_type:MovementType) -> float:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
+        df["datetime"] = parse_datetimes(df["datetime"])
         current_year  = datetime.now().year
         current_month = datetime.now().month
         current_day   = datetime.now().day
@@ -68,11 +82,13 @@ def get_current_day_movements(df: pd.DataFrame, movement_type:MovementType) -> f
         return current_day_expenses
     except Exception as e:
         logging.error(f"Error getting the current day expenses: {e}")
+        record_error()
         return 0.0
     
+@timed()
 def get_last_day_movements(df: pd.DataFrame, movement_type:MovementType) -> float:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
+        df["datetime"] = parse_datetimes(df["datetime"])
         last_day = datetime.now().day - 1
 
         if last_day == 0:
@@ -83,11 +99,13 @@ def get_last_day_movements(df: pd.DataFrame, movement_type:MovementType) -> floa
         return last_day_expenses
     except Exception as e:
         logging.error(f"Error getting the last day expenses: {e}")
+        record_error()
         return 0.0
 
+@timed()
 def get_last_month_movements(df: pd.DataFrame, movement_type:MovementType) -> float:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
+        df["datetime"] = parse_datetimes(df["datetime"])
         last_month = datetime.now().month - 1
 
         if last_month == 0:
@@ -98,11 +116,13 @@ def get_last_month_movements(df: pd.DataFrame, movement_type:MovementType) -> fl
         return last_month_expenses
     except Exception as e:
         logging.error(f"Error getting the last month expenses: {e}")
+        record_error()
         return 0.0
 
+@timed()
 def get_current_month_movements(df: pd.DataFrame, movement_type:MovementType) -> float:
     try:
-        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S")
+        df["datetime"] = parse_datetimes(df["datetime"])
         current_year   = datetime.now().year
         current_month  = datetime.now().month
 
@@ -113,11 +133,37 @@ def get_current_month_movements(df: pd.DataFrame, movement_type:MovementType) ->
         return current_month_expenses
     except Exception as e:
         logging.error(f"Error getting the current month expenses: {e}")
+        record_error()
         return 0.0
 
-def plot_line_total_movements_by_month(df: pd.DataFrame, movement_type:MovementType):
+@timed()
+def get_period_totals(df: pd.DataFrame, now: datetime = None) -> pd.DataFrame:
+    try:
+        bounds    = get_period_bounds(now)
+        windows   = list(bounds.keys())
+        starts    = np.array([start for start, _ in bounds.values()], dtype="datetime64[ns]")
+        ends      = np.array([end for _, end in bounds.values()], dtype="datetime64[ns]")
+        timestamp = parse_datetimes(df["datetime"]).to_numpy(dtype="datetime64[ns]")
+
+        in_window = (timestamp[:, None] >= starts) & (timestamp[:, None] < ends)
+        amounts   = in_window * df["amount"].to_numpy(dtype=float)[:, None]
+
+        totals = pd.DataFrame(amounts, columns=pd.MultiIndex.from_tuples(windows, names=["period", "window"]))
+        totals = totals.groupby(df["movement_type"].astype(str).to_numpy()).sum()
+        totals = totals.reindex([movement_type.value for movement_type in MovementType], fill_value=0.0)
+        totals.index.name = "movement_type"
+
+        return totals.stack(["period", "window"]).rename("amount").reset_index()
+    except Exception as e:
+        logging.error(f"Error getting the period totals: {e}")
+        record_error()
+        return None
+
+@timed()
+def plot_line_total_movements_by_month(df: pd.DataFrame, movement_type:MovementType, total_movements_by_month: pd.DataFrame = None):
     try:
-        total_movements_by_month = get_total_movements_by_month(df, movement_type)
+        if total_movements_by_month is None:
+            total_movements_by_month = get_total_movements_by_month(df, movement_type)
 
         if total_movements_by_month is not None:
             fig = px.line(
@@ -134,11 +180,14 @@ def plot_line_total_movements_by_month(df: pd.DataFrame, movement_type:MovementT
             return None
     except Exception as e:
         logging.error(f"Error plotting the total movements by month: {e}")
+        record_error()
         return None
     
-def plot_total_movements_by_month(df: pd.DataFrame, movement_type:MovementType):
+@timed()
+def plot_total_movements_by_month(df: pd.DataFrame, movement_type:MovementType, total_movements_by_month: pd.DataFrame = None):
     try:
-        total_movements_by_month = get_total_movements_by_month(df, movement_type)
+        if total_movements_by_month is None:
+            total_movements_by_month = get_total_movements_by_month(df, movement_type)
 
         if total_movements_by_month is not None:
             fig = px.bar(
@@ -156,11 +205,13 @@ def plot_total_movements_by_month(df: pd.DataFrame, movement_type:MovementType):
             return None
     except Exception as e:
         logging.error(f"Error plotting the total movements by month: {e}")
+        record_error()
         return None
     
+@timed()
 def plot_pie_movement_by_category(df: pd.DataFrame, movement_type:MovementType):
     try:
-        total_movements_by_category = df[df["movement_type"] == movement_type].groupby("category")["amount"].sum().reset_index()
+        total_movements_by_category = df[df["movement_type"] == movement_type].groupby("category", observed=True)["amount"].sum().reset_index()
 
         if total_movements_by_category is not None:
             fig = px.pie(
@@ -175,11 +226,13 @@ def plot_pie_movement_by_category(df: pd.DataFrame, movement_type:MovementType):
             return None
     except Exception as e:
         logging.error(f"Error plotting the movements by category: {e}")
+        record_error()
         return None
 
+@timed()
 def plot_bar_movement_by_source_name(df: pd.DataFrame, movement_type:MovementType):
     try:
-        total_movements_by_source_name = df[df["movement_type"] == movement_type].groupby("source_name")["amount"].sum().reset_index()
+        total_movements_by_source_name = df[df["movement_type"] == movement_type].groupby("source_name", observed=True)["amount"].sum().reset_index()
 
         if total_movements_by_source_name is not None:
             fig = px.bar(
@@ -194,4 +247,5 @@ def plot_bar_movement_by_source_name(df: pd.DataFrame, movement_type:MovementTyp
         else:
             return None
     except Exception as e:
-        logging.error(f"Error plotting the movements by source name: {e}")
\ No newline at end of file
+        logging.error(f"Error plotting the movements by source name: {e}")
+        record_error()
\ No newline at end of file
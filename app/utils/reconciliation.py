@@ -0,0 +1,248 @@
+import logging
+import argparse
+import streamlit as st
+
+from pymongo import UpdateOne
+from utils.models import MovementType
+from utils.database import get_collection, use_transactions
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+RECONCILIATION_BATCH_SIZE = 500
+BALANCE_TOLERANCE         = 0.005
+MAX_REPORTED_DRIFTS       = 100
+
+SOURCE_PROJECTION = {"username": 1, "source_name": 1, "source_type": 1, "source_balance": 1, "opening_balance": 1, "pending_imports": 1}
+
+# The importer counts its running imports on the source and only applies their balance at the end
+NO_PENDING_IMPORTS = {"pending_imports": {"$not": {"$gt": 0}}}
+
+def get_reconciliation_collections() -> tuple:
+    return tuple(
+        get_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections[collection_key]
+        )
+        for collection_key in ["finance_collection_name", "sources_collection_name"]
+    )
+
+def iter_username_batches(sources_collection, batch_size: int = RECONCILIATION_BATCH_SIZE, usernames: list = None):
+    if usernames:
+        usernames = sorted(usernames)
+
+        for start in range(0, len(usernames), batch_size):
+            yield usernames[start:start + batch_size]
+
+        return
+
+    cursor = sources_collection.aggregate(
+        [
+            {"$group": {"_id": "$username"}},
+            {"$sort": {"_id": 1}}
+        ],
+        allowDiskUse=True,
+        batchSize=batch_size
+    )
+
+    batch = []
+
+    for document in cursor:
+        batch.append(document["_id"])
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+def build_ledger_balances_pipeline(usernames: list) -> list:
+    return [
+        {"$match": {"username": {"$in": usernames}}},
+        {
+            "$group": {
+                "_id": {
+                    "username": "$username",
+                    "source_name": "$source_name",
+                    "source_type": "$source_type"
+                },
+                "delta": {
+                    "$sum": {
+                        "$cond": [
+                            {"$eq": ["$movement_type", MovementType.EXPENSE.value]},
+                            {"$multiply": ["$amount", -1]},
+                            "$amount"
+                        ]
+                    }
+                },
+                "count": {"$sum": 1}
+            }
+        }
+    ]
+
+def get_ledger_balances(finance_collection, usernames: list) -> dict:
+    return {
+        (document["_id"]["username"], document["_id"]["source_name"], document["_id"]["source_type"]): document
+        for document in finance_collection.aggregate(build_ledger_balances_pipeline(usernames), allowDiskUse=True)
+    }
+
+def get_source_key(source: dict) -> tuple:
+    return source["username"], source["source_name"], source["source_type"]
+
+def get_expected_balance(source: dict, ledger: dict) -> float:
+    return source["opening_balance"] + ledger.get(get_source_key(source), {"delta": 0.0})["delta"]
+
+def can_repair() -> bool:
+    # Without transactions an accept inserts its movements and $incs the balance concurrently, a
+    # movement already in the ledger whose $inc has not landed would be counted twice by a repair
+    return use_transactions()
+
+def repair_drifts(finance_collection, sources_collection, drifts: dict) -> int:
+    # A second read has to find the same drift and the update only applies while the balance
+    # still holds the value read and no import is running on the source. This only guards
+    # against writes that update the ledger and the balance together, see can_repair.
+    sources = list(sources_collection.find({"_id": {"$in": list(drifts)}, **NO_PENDING_IMPORTS}, SOURCE_PROJECTION))
+    ledger  = get_ledger_balances(finance_collection, sorted({source["username"] for source in sources}))
+    updates = []
+
+    for source in sources:
+        expected = get_expected_balance(source, ledger)
+        drift    = (source.get("source_balance") or 0.0) - expected
+
+        if abs(drift - drifts[source["_id"]]) > BALANCE_TOLERANCE:
+            continue
+
+        updates.append(
+            UpdateOne(
+                {"_id": source["_id"], "source_balance": source.get("source_balance"), **NO_PENDING_IMPORTS},
+                {"$set": {"source_balance": expected}}
+            )
+        )
+
+    return sources_collection.bulk_write(updates, ordered=False).modified_count if updates else 0
+
+def reconcile_batch(finance_collection, sources_collection, usernames: list, repair: bool = False) -> dict:
+    # Sources are read before the ledger, a movement accepted in between can only show up as a
+    # drift that repair_drifts then finds has moved
+    sources = list(sources_collection.find({"username": {"$in": usernames}}, SOURCE_PROJECTION))
+    ledger  = get_ledger_balances(finance_collection, usernames)
+    result  = {"sources": len(sources), "drifted": 0, "repaired": 0, "skipped_repairs": 0, "missing_opening_balance": 0, "drifts": []}
+    drifts  = {}
+
+    for source in sources:
+        entry = ledger.pop(get_source_key(source), {"delta": 0.0, "count": 0})
+
+        if source.get("opening_balance") is None:
+            result["missing_opening_balance"] += 1
+            continue
+
+        expected = source["opening_balance"] + entry["delta"]
+        drift    = (source.get("source_balance") or 0.0) - expected
+
+        if abs(drift) <= BALANCE_TOLERANCE:
+            continue
+
+        result["drifted"] += 1
+        result["drifts"].append(
+            {
+                "username": source["username"],
+                "source_name": source["source_name"],
+                "source_type": source["source_type"],
+                "source_balance": source.get("source_balance"),
+                "expected_balance": expected,
+                "drift": drift,
+                "pending_imports": source.get("pending_imports") or 0
+            }
+        )
+
+        drifts[source["_id"]] = drift
+
+    if repair and drifts and can_repair():
+        result["repaired"] = repair_drifts(finance_collection, sources_collection, drifts)
+
+    result["skipped_repairs"] = result["drifted"] - result["repaired"] if repair else 0
+
+    # Movements whose source no longer exists cannot be reconciled
+    result["orphan_movements"] = sum(entry["count"] for entry in ledger.values())
+
+    return result
+
+@timed()
+def reconcile_balances(finance_collection, sources_collection, repair: bool = False,
+                       batch_size: int = RECONCILIATION_BATCH_SIZE, usernames: list = None) -> dict:
+    summary = {
+        "users": 0, "sources": 0, "drifted": 0, "repaired": 0, "skipped_repairs": 0,
+        "missing_opening_balance": 0, "orphan_movements": 0, "drifts": []
+    }
+
+    if repair and not can_repair():
+        logging.warning("Balances are only repaired when accepts run in transactions, set db_options.use_transactions")
+
+    try:
+        for batch in iter_username_batches(sources_collection, batch_size, usernames):
+            result = reconcile_batch(finance_collection, sources_collection, batch, repair)
+
+            summary["users"] += len(batch)
+
+            for key in ["sources", "drifted", "repaired", "skipped_repairs", "missing_opening_balance", "orphan_movements"]:
+                summary[key] += result[key]
+
+            summary["drifts"] = (summary["drifts"] + result["drifts"])[:MAX_REPORTED_DRIFTS]
+
+        logging.info(f"Balances reconciled: { {key: value for key, value in summary.items() if key != 'drifts'} }")
+
+        return summary
+    except Exception as e:
+        logging.error(f"Error reconciling the source balances: {e}")
+        record_error()
+        return None
+
+@timed()
+def backfill_opening_balances(finance_collection, sources_collection, batch_size: int = RECONCILIATION_BATCH_SIZE) -> int:
+    backfilled = 0
+
+    for batch in iter_username_batches(sources_collection, batch_size):
+        sources = list(sources_collection.find({"username": {"$in": batch}, "opening_balance": {"$exists": False}}, SOURCE_PROJECTION))
+        ledger  = get_ledger_balances(finance_collection, batch)
+
+        # Legacy sources trust their current balance and derive the opening balance from it,
+        # a source whose balance moved since it was read is left for the next run
+        updates = [
+            UpdateOne(
+                {"_id": source["_id"], "opening_balance": {"$exists": False}, "source_balance": source.get("source_balance"), **NO_PENDING_IMPORTS},
+                {
+                    "$set": {
+                        "opening_balance": (source.get("source_balance") or 0.0)
+                                           - ledger.get(get_source_key(source), {"delta": 0.0})["delta"]
+                    }
+                }
+            )
+            for source in sources
+        ]
+
+        if updates:
+            backfilled += sources_collection.bulk_write(updates, ordered=False).modified_count
+
+    logging.info(f"Opening balances backfilled for {backfilled} sources")
+
+    return backfilled
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute every source balance from the finance collection")
+    parser.add_argument("--repair", action="store_true", help="Correct the drifted balances")
+    parser.add_argument("--backfill", action="store_true", help="Derive the missing opening balances first")
+    parser.add_argument("--username", action="append", help="Only reconcile these users")
+    parser.add_argument("--batch-size", type=int, default=RECONCILIATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    finance_collection, sources_collection = get_reconciliation_collections()
+
+    if args.backfill:
+        backfill_opening_balances(finance_collection, sources_collection, args.batch_size)
+
+    summary = reconcile_balances(finance_collection, sources_collection, args.repair, args.batch_size, args.username)
+
+    for drift in (summary or {}).get("drifts", []):
+        logging.info(f"Drift on {drift['username']} / {drift['source_name']}: {drift['drift']:+.2f}")
@@ -0,0 +1,123 @@
+import logging
+import argparse
+import pandas as pd
+import streamlit as st
+
+from utils.models import MovementType
+from utils.dates import parse_movement_datetime, get_datetime_expression
+from utils.database import get_collection, get_read_profile
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+ROLLUP_KEY_FIELDS = ["username", "year", "month", "movement_type", "category", "source_name"]
+
+def get_rollups_collection(profile: str = None):
+    return get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        st.secrets.db_collections.rollups_collection_name,
+        profile
+    )
+
+def get_rollup_key(movement_dict: dict, username: str) -> dict:
+    movement_datetime = parse_movement_datetime(movement_dict["datetime"])
+
+    return {
+        "username": username,
+        "year": movement_datetime.year,
+        "month": movement_datetime.month,
+        "movement_type": MovementType(movement_dict["movement_type"]).value,
+        "category": movement_dict["category"].upper(),
+        "source_name": movement_dict["source_name"]
+    }
+
+def build_rollups_pipeline(rollups_collection_name: str, username: str = None) -> list:
+    match = {"username": username} if username else {}
+
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "username": "$username",
+                    "year": {"$year": get_datetime_expression()},
+                    "month": {"$month": get_datetime_expression()},
+                    "movement_type": "$movement_type",
+                    "category": "$category",
+                    "source_name": "$source_name"
+                },
+                "amount": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                **{field: f"$_id.{field}" for field in ROLLUP_KEY_FIELDS},
+                "amount": 1,
+                "count": 1,
+                "updated_at": "$$NOW"
+            }
+        },
+        {
+            "$merge": {
+                "into": rollups_collection_name,
+                "on": ROLLUP_KEY_FIELDS,
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }
+        }
+    ]
+
+@timed()
+def rebuild_rollups(finance_collection, rollups_collection, username: str = None) -> bool:
+    # $merge replaces every key it produces, so an accept or import that $incs a rollup while the
+    # aggregation runs is overwritten. Run the rebuild with writes stopped for the users it covers.
+    try:
+        rollups_collection.create_index(ROLLUP_KEY_FIELDS, unique=True)
+
+        # Readers keep seeing the previous rollups while $merge replaces them in place
+        rebuilt_at = rollups_collection.database.command("hello")["localTime"]
+
+        finance_collection.aggregate(build_rollups_pipeline(rollups_collection.name, username))
+
+        # Keys the rebuild did not produce and no write touched since then have no movements left
+        rollups_collection.delete_many(
+            {
+                **({"username": username} if username else {}),
+                "updated_at": {"$not": {"$gte": rebuilt_at}}
+            }
+        )
+
+        logging.info(f"Rollups rebuilt for {username or 'all users'}")
+
+        return True
+    except Exception as e:
+        logging.error(f"Error rebuilding the rollups: {e}")
+        record_error()
+        return False
+
+@timed()
+def load_rollups(username: str) -> pd.DataFrame:
+    try:
+        rollups = get_rollups_collection(get_read_profile(username)).find({"username": username}, {"_id": 0, "username": 0, "updated_at": 0})
+
+        return pd.DataFrame(list(rollups))
+    except Exception as e:
+        logging.error(f"Error loading the rollups: {e}")
+        record_error()
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the monthly rollups from the finance collection, with writes stopped")
+    parser.add_argument("--username", default=None, help="Only rebuild the rollups of this user")
+    args = parser.parse_args()
+
+    finance_collection = get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        st.secrets.db_collections.finance_collection_name
+    )
+
+    rebuild_rollups(finance_collection, get_rollups_collection(), args.username)
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import threading
+
+from concurrent.futures import Future
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+class AsyncRuntime:
+    def __init__(self):
+        self.loop   = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="finbot-async-runtime", daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout: float = None):
+        return self.submit(coroutine).result(timeout)
+
+    def gather(self, *coroutines, timeout: float = None) -> list:
+        async def gather_all():
+            return await asyncio.gather(*coroutines)
+
+        return self.run(gather_all(), timeout)
+
+_runtime      = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> AsyncRuntime:
+    global _runtime
+
+    with _runtime_lock:
+        if _runtime is None or not _runtime.thread.is_alive():
+            _runtime = AsyncRuntime()
+
+            logging.info("Background asyncio runtime started")
+
+        return _runtime
+
+def submit_async(coroutine) -> Future:
+    return get_runtime().submit(coroutine)
+
+def run_async(coroutine, timeout: float = None):
+    return get_runtime().run(coroutine, timeout)
+
+def gather_async(*coroutines, timeout: float = None) -> list:
+    return get_runtime().gather(*coroutines, timeout=timeout)
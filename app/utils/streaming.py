@@ -0,0 +1,75 @@
+import json
+import logging
+
+from typing import Callable, List, Optional
+from pydantic import ValidationError
+from utils.models import Movement
+from utils.telemetry import timed
+from langchain_core.utils.json import parse_partial_json
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+def get_chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", chunk)
+
+    return content if isinstance(content, str) else ""
+
+def get_movement_rows(data) -> list:
+    if isinstance(data, dict) and isinstance(data.get("movements"), list):
+        data = data["movements"]
+
+    if isinstance(data, dict):
+        data = [data]
+
+    if not isinstance(data, list):
+        return []
+
+    return [row for row in data if isinstance(row, dict) and row]
+
+def parse_partial_movements(text: str) -> list:
+    start = text.find("{")
+
+    if start == -1:
+        return []
+
+    try:
+        partial = parse_partial_json(text[start:])
+    except Exception:
+        return []
+
+    return get_movement_rows(partial)
+
+def parse_complete_movements(text: str) -> Optional[List[Movement]]:
+    start = text.find("{")
+
+    if start == -1:
+        return None
+
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text[start:])
+        rows    = get_movement_rows(data)
+
+        return [Movement(**row) for row in rows] if rows else None
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+@timed()
+def stream_movements(chain, inputs: dict, on_partial: Callable[[list], None] = None) -> tuple:
+    text     = ""
+    previous = None
+
+    for chunk in chain.stream(inputs):
+        text += get_chunk_text(chunk)
+
+        movements = parse_complete_movements(text)
+
+        if movements is not None:
+            return movements, text
+
+        partial = parse_partial_movements(text)
+
+        if on_partial is not None and partial and partial != previous:
+            on_partial(partial)
+            previous = partial
+
+    return None, text
@@ -0,0 +1,297 @@
+import io
+import time
+import errno
+import inspect
+import pstats
+import logging
+import cProfile
+import functools
+import threading
+import streamlit as st
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo.monitoring import CommandListener
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+DEFAULT_TELEMETRY_SETTINGS = {
+    "enabled": True,
+    "profiling": False,
+    "exporter": False,
+    "host": "127.0.0.1",
+    "port": 9464,
+    "profile_lines": 25
+}
+
+HISTOGRAM_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+_metrics_lock  = threading.Lock()
+_metrics       = {}
+_profiles      = {}
+_profiler_lock = threading.Lock()
+_state         = {"enabled": None, "profiling": None}
+
+# Most instrumented functions log and swallow their errors, they flag the innermost span instead
+_current_span = ContextVar("current_span", default=None)
+
+_server       = None
+_server_lock  = threading.Lock()
+_server_state = {"failed": False}
+
+def get_telemetry_settings() -> dict:
+    settings = dict(DEFAULT_TELEMETRY_SETTINGS)
+
+    try:
+        settings.update(st.secrets.get("telemetry", {}))
+    except Exception as e:
+        logging.info(f"Using the default telemetry settings: {e}")
+
+    return settings
+
+def is_enabled() -> bool:
+    if _state["enabled"] is None:
+        _state["enabled"] = bool(get_telemetry_settings()["enabled"])
+
+    return _state["enabled"]
+
+def set_enabled(enabled: bool):
+    _state["enabled"] = enabled
+
+def is_profiling() -> bool:
+    if _state["profiling"] is None:
+        _state["profiling"] = bool(get_telemetry_settings()["profiling"])
+
+    return _state["profiling"]
+
+def set_profiling(profiling: bool):
+    _state["profiling"] = profiling
+
+def observe(operation: str, seconds: float, error: bool = False):
+    with _metrics_lock:
+        metric = _metrics.get(operation)
+
+        if metric is None:
+            metric = _metrics[operation] = {
+                "count": 0,
+                "errors": 0,
+                "sum": 0.0,
+                "max": 0.0,
+                "buckets": [0] * len(HISTOGRAM_BUCKETS)
+            }
+
+        metric["count"] += 1
+        metric["sum"]   += seconds
+        metric["max"]    = max(metric["max"], seconds)
+
+        if error:
+            metric["errors"] += 1
+
+        for index, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                metric["buckets"][index] += 1
+                break
+
+def _store_profile(operation: str, profiler: cProfile.Profile):
+    output = io.StringIO()
+
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(get_telemetry_settings()["profile_lines"])
+
+    with _metrics_lock:
+        _profiles[operation] = output.getvalue()
+
+@contextmanager
+def span(operation: str, profile: bool = True):
+    if not is_enabled():
+        yield
+        return
+
+    # Only one cProfile can run at a time, nested or concurrent spans are only timed
+    profiler = None
+
+    if profile and is_profiling() and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    state = {"error": False}
+    token = _current_span.set(state)
+    start = time.perf_counter()
+
+    try:
+        yield
+    except Exception:
+        state["error"] = True
+        raise
+    finally:
+        _current_span.reset(token)
+        observe(operation, time.perf_counter() - start, state["error"])
+
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+            _store_profile(operation, profiler)
+
+def record_error():
+    state = _current_span.get()
+
+    if state is not None:
+        state["error"] = True
+
+def timed(operation: str = None):
+    def decorator(function):
+        name = operation or f"{function.__module__.split('.')[-1]}.{function.__name__}"
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                # cProfile cannot follow a coroutine across awaits, so coroutines are only timed
+                with span(name, profile=False):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+class CommandTimingListener(CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if is_enabled():
+            observe(f"mongo.{event.command_name}", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        if is_enabled():
+            observe(f"mongo.{event.command_name}", event.duration_micros / 1e6, error=True)
+
+def get_metrics_snapshot() -> list:
+    with _metrics_lock:
+        metrics = {operation: dict(metric, buckets=list(metric["buckets"])) for operation, metric in _metrics.items()}
+
+    snapshot = []
+
+    for operation, metric in sorted(metrics.items()):
+        snapshot.append(
+            {
+                "operation": operation,
+                "count": metric["count"],
+                "errors": metric["errors"],
+                "total_seconds": metric["sum"],
+                "mean_seconds": metric["sum"] / metric["count"] if metric["count"] else 0.0,
+                "p50_seconds": get_quantile(metric, 0.5),
+                "p95_seconds": get_quantile(metric, 0.95),
+                "max_seconds": metric["max"]
+            }
+        )
+
+    return snapshot
+
+def get_quantile(metric: dict, quantile: float) -> float:
+    target     = quantile * metric["count"]
+    cumulative = 0
+
+    for bound, count in zip(HISTOGRAM_BUCKETS, metric["buckets"]):
+        cumulative += count
+
+        if count and cumulative >= target:
+            return bound
+
+    return metric["max"]
+
+def get_profiles() -> dict:
+    with _metrics_lock:
+        return dict(_profiles)
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+        _profiles.clear()
+
+def render_prometheus() -> str:
+    with _metrics_lock:
+        metrics = {operation: dict(metric, buckets=list(metric["buckets"])) for operation, metric in _metrics.items()}
+
+    lines = [
+        "# HELP finbot_operation_duration_seconds Latency of instrumented operations",
+        "# TYPE finbot_operation_duration_seconds histogram"
+    ]
+
+    for operation, metric in sorted(metrics.items()):
+        label      = operation.replace("\\", "\\\\").replace('"', '\\"')
+        cumulative = 0
+
+        for bound, count in zip(HISTOGRAM_BUCKETS, metric["buckets"]):
+            cumulative += count
+            lines.append(f'finbot_operation_duration_seconds_bucket{{operation="{label}",le="{bound}"}} {cumulative}')
+
+        lines.append(f'finbot_operation_duration_seconds_bucket{{operation="{label}",le="+Inf"}} {metric["count"]}')
+        lines.append(f'finbot_operation_duration_seconds_sum{{operation="{label}"}} {metric["sum"]}')
+        lines.append(f'finbot_operation_duration_seconds_count{{operation="{label}"}} {metric["count"]}')
+
+    lines += [
+        "# HELP finbot_operation_errors_total Instrumented operations that raised",
+        "# TYPE finbot_operation_errors_total counter"
+    ]
+
+    for operation, metric in sorted(metrics.items()):
+        label = operation.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'finbot_operation_errors_total{{operation="{label}"}} {metric["errors"]}')
+
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render_prometheus().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server() -> str:
+    global _server
+
+    with _server_lock:
+        if _server is None:
+            settings = get_telemetry_settings()
+
+            # The endpoint is opt-in, every app process would otherwise compete for the same port
+            if not settings["exporter"] or _server_state["failed"]:
+                return None
+
+            try:
+                _server = ThreadingHTTPServer((settings["host"], int(settings["port"])), MetricsHandler)
+            except OSError as e:
+                # Reruns call this again, one failed bind is enough to stop retrying in this process
+                _server_state["failed"] = True
+
+                if e.errno == errno.EADDRINUSE:
+                    logging.warning(f"Metrics endpoint disabled, {settings['host']}:{settings['port']} is already in use")
+                else:
+                    logging.error(f"Error starting the metrics endpoint: {e}")
+
+                return None
+
+            threading.Thread(target=_server.serve_forever, name="finbot-metrics", daemon=True).start()
+
+            logging.info(f"Metrics endpoint listening on {settings['host']}:{settings['port']}")
+
+        host, port = _server.server_address[:2]
+
+        return f"http://{host}:{port}/metrics"
@@ -0,0 +1,118 @@
+import logging
+import streamlit as st
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from utils.database import get_collection, get_collection_name
+from utils.telemetry import timed, record_error
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+AUTH_SETTINGS_PROJECTION = {"_id": 0, "cookie": 1, "oauth2": 1}
+USER_PROJECTION          = {"_id": 0, "username": 0}
+SPLIT_BATCH_SIZE         = 1000
+
+def get_config_collection():
+    return get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        st.secrets.db_collections.config_collection_name
+    )
+
+def get_users_collection():
+    return get_collection(
+        st.secrets.db_credentials.uri,
+        st.secrets.db_credentials.database_name,
+        get_collection_name("users_collection_name")
+    )
+
+class UserCredentials(dict):
+    # Users are fetched from their own document the first time they are looked up.
+    # Iterating only sees the users this process has already loaded.
+    def __init__(self, users_collection):
+        super().__init__()
+        self.users_collection = users_collection
+
+    def _load(self, username) -> bool:
+        if dict.__contains__(self, username):
+            return True
+
+        document = self.users_collection.find_one({"username": username}, USER_PROJECTION)
+
+        if document is None:
+            return False
+
+        dict.__setitem__(self, username, document)
+
+        return True
+
+    def __contains__(self, username) -> bool:
+        return self._load(username)
+
+    def __missing__(self, username):
+        if self._load(username):
+            return dict.__getitem__(self, username)
+
+        raise KeyError(username)
+
+    def get(self, username, default=None):
+        return self[username] if username in self else default
+
+@st.cache_resource
+def load_auth_settings() -> dict:
+    document = get_config_collection().find_one(
+        {"_id": ObjectId(st.secrets.config.config_id_from_db)},
+        AUTH_SETTINGS_PROJECTION
+    )
+
+    if document is None:
+        raise ValueError("Auth config not found")
+
+    return document
+
+def get_auth_settings() -> dict:
+    try:
+        return load_auth_settings()
+    except Exception as e:
+        logging.error(f"Error loading the auth settings: {e}")
+        return None
+
+@timed()
+def save_user(username: str, user_data: dict):
+    try:
+        get_users_collection().update_one(
+            {"username": username},
+            {"$set": {field: value for field, value in user_data.items() if field != "username"}},
+            upsert=True
+        )
+    except Exception as e:
+        logging.error(f"Error saving the user {username}: {e}")
+        record_error()
+
+def split_config_credentials(database):
+    config_collection = database[st.secrets.db_collections.config_collection_name]
+    users_collection  = database[get_collection_name("users_collection_name")]
+    config_id         = ObjectId(st.secrets.config.config_id_from_db)
+
+    document  = config_collection.find_one({"_id": config_id}, {"credentials.usernames": 1}) or {}
+    usernames = list(document.get("credentials", {}).get("usernames", {}).items())
+
+    for start in range(0, len(usernames), SPLIT_BATCH_SIZE):
+        updates = [
+            UpdateOne(
+                {"username": username},
+                {"$setOnInsert": {field: value for field, value in user_data.items() if field != "username"}},
+                upsert=True
+            )
+            for username, user_data in usernames[start:start + SPLIT_BATCH_SIZE]
+            if user_data
+        ]
+
+        # A batch of users without data has nothing to write and bulk_write rejects an empty list
+        if updates:
+            users_collection.bulk_write(updates, ordered=False)
+
+    # The shared document only keeps the cookie and oauth2 settings once every user is copied
+    config_collection.update_one({"_id": config_id}, {"$unset": {"credentials": ""}})
+
+    logging.info(f"{len(usernames)} users moved to their own documents")
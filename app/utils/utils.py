@@ -1,35 +1,90 @@
+import asyncio
+import functools
 import logging
 import streamlit as st
 
+from typing import List
+from pymongo import UpdateOne
+from collections import defaultdict
 from langchain_ollama import OllamaLLM
 from langchain_openai import ChatOpenAI
-from utils.models import Movement, MovementType
-from motor.motor_asyncio import AsyncIOMotorClient
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import PydanticOutputParser
+from utils.models import Movement, Movements, MovementType, SourceType
+from utils.runtime import gather_async
+from utils.rollups import get_rollup_key
+from utils.checkpoints import get_checkpoint_invalidations, get_checkpoint_epoch_updates
+from utils.dates import DATETIME_FORMAT, get_now, parse_movement_datetime
+from utils.database import get_async_collection, get_async_mongo_client, get_collection_name, mark_user_write, use_transactions
+from utils.telemetry import timed, record_error
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
 
-def get_model():
-    try:
-        model = ChatOpenAI(
-            api_key=st.secrets.openai.api_key, 
-            model="gpt-4o"
-        )
+PROMPT_TEMPLATE = "Answer the user query. Extract every money movement the user mentions. Identify the money source according to the user sources: {user_sources}\n{format_instructions}\n{query}\n"
+
+@st.cache_resource
+def load_model():
+    model = ChatOpenAI(
+        api_key=st.secrets.openai.api_key, 
+        model="gpt-4o"
+    )
+
+    # model = OllamaLLM(model="deepseek-r1:14b")
 
-        # model = OllamaLLM(model="deepseek-r1:14b")
+    return model
 
-        return model
+def get_model():
+    try:
+        return load_model()
     except Exception as e:
         st.write(f"Error loading the model: {e}")
 
+@st.cache_resource
+def get_output_parser() -> PydanticOutputParser:
+    return PydanticOutputParser(pydantic_object=Movements)
+
+@st.cache_resource
+def get_prompt_template() -> PromptTemplate:
+    return PromptTemplate(
+        template=PROMPT_TEMPLATE,
+        input_variables=["query", "user_sources"],
+        partial_variables={"format_instructions": get_output_parser().get_format_instructions()},
+    )
+
+def get_prompt_sources(sources: list) -> list:
+    return [
+        {"source_name": source["source_name"], "source_type": source["source_type"]}
+        for source in sources or []
+    ]
+
+def get_user_resources(username: str) -> tuple:
+    user_resources = st.session_state.get("user_resources")
+
+    if user_resources is None or user_resources["username"] != username:
+        sources, categories = gather_async(get_sources(username), get_categories(username))
+
+        user_resources = {"username": username, "sources": sources, "categories": categories}
+        st.session_state.user_resources = user_resources
+
+    return user_resources["sources"], user_resources["categories"]
+
+def invalidate_user_resources():
+    st.session_state.user_resources = None
+
 def find_source_by_name(sources_list, source_name):
     for source in sources_list:
         if source["source_name"].upper() == source_name.upper():
             return source
     return None
 
+@timed()
 async def get_sources(username: str):
     try:
-        source_collection = AsyncIOMotorClient(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name][st.secrets.db_collections.sources_collection_name]
+        source_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.sources_collection_name
+        )
 
         cursor = source_collection.find({"username": username})
         sources = await cursor.to_list(length=None)
@@ -40,134 +95,299 @@ async def get_sources(username: str):
             return None
     except Exception as e:
         logging.error(f"Error getting the sources: {e}")
+        record_error()
         return None
 
-async def update_source_balance(movement: Movement, username: str):
+@timed()
+async def get_categories(username: str) -> list:
     try:
-        source_name   = movement.source_name
-        source_type   = movement.source_type
-        movement_type = movement.movement_type
-        amount        = movement.amount
+        category_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.categories_collection_name
+        )
+
+        user_categories = await category_collection.find_one({"username": username}, {"categories": 1})
+
+        if user_categories and "categories" in user_categories:
+            return user_categories["categories"]
+        else:
+            return []
+    except Exception as e:
+        logging.error(f"Error getting the categories: {e}")
+        record_error()
+        return []
+
+def get_balance_delta(movement: Movement) -> float:
+    if movement.movement_type == MovementType.EXPENSE:
+        return -movement.amount
+
+    return movement.amount
 
-        source_collection = AsyncIOMotorClient(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name][st.secrets.db_collections.sources_collection_name]
+def get_movement_document(movement: Movement, username: str) -> dict:
+    movement_dict = movement.model_dump()
+    movement_dict["username"] = username
+    movement_dict["category"] = movement_dict["category"].upper()
+    movement_dict["datetime"] = parse_movement_datetime(movement_dict["datetime"]) or get_now()
+
+    return movement_dict
+
+def validate_movement_category(movement: Movement):
+    category      = movement.category.upper()
+    movement_type = movement.movement_type
+
+    if movement_type == MovementType.INCOME.value and category != MovementType.INCOME.value.upper():
+        raise ValueError(f"If movement_type is '{movement_type}', category must be '{MovementType.INCOME.value}, not '{category}'")
+
+@timed()
+async def update_source_balance(movement: Movement, username: str):
+    try:
+        source_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.sources_collection_name
+        )
 
-        source = await source_collection.find_one(
+        result = await source_collection.update_one(
             {
                 "username": username,
-                "source_name": source_name, 
-                "source_type": source_type
+                "source_name": movement.source_name, 
+                "source_type": movement.source_type
+            },
+            {
+                "$inc": {
+                    "source_balance": get_balance_delta(movement)
+                }
             }
         )
 
-        if source:
-            source_balance     = source["source_balance"]
-            new_source_balance = source_balance
-            
-            if movement_type == MovementType.EXPENSE:
-                new_source_balance -= amount
-            elif movement_type == MovementType.INCOME:
-                new_source_balance += amount
-
-            if new_source_balance != source_balance:
-                await source_collection.update_one(
-                    {
-                        "username": username,
-                        "source_name": source_name, 
-                        "source_type": source_type
-                    },
-                    {
-                        "$set": {
-                            "source_balance": new_source_balance
-                        }
-                    }
-                )
-
-                logging.info(f"Source balance updated for {username}: {source_name}")
+        if result.modified_count:
+            logging.info(f"Source balance updated for {username}: {movement.source_name}")
     except Exception as e:
         logging.error(f"Error updating the source balance: {e}")
+        record_error()
 
+@timed()
 async def validate_or_add_source(movement_dict: dict, username: str) -> dict:
     try:
-        source_collection = AsyncIOMotorClient(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name][st.secrets.db_collections.sources_collection_name]
+        source_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.sources_collection_name
+        )
 
         source_name = movement_dict.get("source_name").upper()
 
-        user_sources = await source_collection.find(
+        # New sources start empty, the movement itself is applied by accept_movements
+        result = await source_collection.update_one(
             {
                 "username": username,
                 "source_name": source_name
-            }
+            },
+            {
+                "$setOnInsert": {
+                    "source_type": movement_dict.get("source_type"),
+                    "last_digits": None,
+                    "source_balance": 0.0,
+                    "opening_balance": 0.0,
+                    "created_at": get_now().strftime(DATETIME_FORMAT)
+                }
+            },
+            upsert=True
         )
 
-        existing_sources = []
-
-        if user_sources:
-            user_sources     = list(user_sources)
-            existing_sources = [user_source["source_name"] for user_source in user_sources]
-
-        if source_name not in existing_sources:
-            await source_collection.update_one(
-                {"username": username},
-                {
-                    "$push": {
-                        "username": username,
-                        "source_name": source_name,
-                        "source_type": movement_dict.get("source_type"),
-                        "last_digits": None,
-                        "source_balance": movement_dict.get("amount")
-                    }
-                },
-                upsert=True
-            )
-
+        if result.upserted_id is not None:
             logging.info(f"New source added for {username}: {source_name}")
 
         return movement_dict
     except Exception as e:
         logging.error(f"Error validating or adding the source: {e}")
+        record_error()
 
+@timed()
 async def validate_or_add_category(movement: Movement, username:str) -> dict:
     try:
-        category_collection = AsyncIOMotorClient(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name][st.secrets.db_collections.categories_collection_name]
+        category_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.categories_collection_name
+        )
 
         logging.info(f"Validating movement: {movement}")
 
-        category      = movement.category.upper()
-        movement_type = movement.movement_type
-
-        if movement_type == MovementType.INCOME.value and category != MovementType.INCOME.value.upper():
-            raise ValueError(f"If movement_type is '{movement_type}', category must be '{MovementType.INCOME.value}, not '{category}'")
-
-        user_categories = await category_collection.find_one({"username": username})
-
-        if user_categories and "categories" in user_categories:
-            existing_categories = user_categories["categories"]
-        else:
-            existing_categories = []
+        validate_movement_category(movement)
 
-        if movement_type == "Gasto" and category not in existing_categories:
+        if movement.movement_type == MovementType.EXPENSE:
             await category_collection.update_one(
                 {"username": username},
-                {"$push": {"categories": category}},
+                {"$addToSet": {"categories": movement.category.upper()}},
                 upsert=True
             )
-            
-            logging.info(f"New category added for {username}: {category}")
 
         return movement
     except Exception as e:
         logging.error(f"Error validating or adding the category: {e}")
+        record_error()
 
+@timed()
+async def update_movement_rollup(movement: Movement, username: str, sign: int = 1):
+    try:
+        rollups_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.rollups_collection_name
+        )
+
+        await rollups_collection.update_one(
+            get_rollup_key(get_movement_document(movement, username), username),
+            {
+                "$inc": {
+                    "amount": sign * movement.amount,
+                    "count": sign
+                },
+                "$currentDate": {"updated_at": True}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logging.error(f"Error updating the movement rollup: {e}")
+        record_error()
+
+@timed()
 async def insert_movement(movement: Movement, username: str):
     try:
-        finance_collection = AsyncIOMotorClient(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name][st.secrets.db_collections.finance_collection_name]
+        finance_collection = get_async_collection(
+            st.secrets.db_credentials.uri,
+            st.secrets.db_credentials.database_name,
+            st.secrets.db_collections.finance_collection_name
+        )
         
-        movement_dict = movement.model_dump()
-        movement_dict["username"] = username
-        movement_dict["category"] = movement_dict["category"].upper()
+        movement_dict = get_movement_document(movement, username)
         
         await finance_collection.insert_one(movement_dict)
+        await update_movement_rollup(movement, username)
 
         logging.info(f"Movement inserted for {username}: {movement_dict}")
     except Exception as e:
-        st.write(f"Error processing the movement: {e}")
\ No newline at end of file
+        st.write(f"Error processing the movement: {e}")
+        record_error()
+
+def get_accept_operations(movements: List[Movement], username: str) -> dict:
+    for movement in movements:
+        validate_movement_category(movement)
+
+    movement_dicts = [get_movement_document(movement, username) for movement in movements]
+    categories     = sorted({
+        movement_dict["category"] for movement_dict in movement_dicts
+        if movement_dict["movement_type"] == MovementType.EXPENSE
+    })
+    balance_deltas = defaultdict(float)
+    rollup_deltas  = defaultdict(lambda: {"amount": 0.0, "count": 0})
+
+    for movement, movement_dict in zip(movements, movement_dicts):
+        balance_deltas[(movement.source_name, SourceType(movement.source_type).value)] += get_balance_delta(movement)
+
+        rollup_key = tuple(get_rollup_key(movement_dict, username).items())
+        rollup_deltas[rollup_key]["amount"] += movement.amount
+        rollup_deltas[rollup_key]["count"]  += 1
+
+    return {
+        "movements": movement_dicts,
+        "categories": categories,
+        "source_updates": [
+            UpdateOne(
+                {
+                    "username": username,
+                    "source_name": source_name,
+                    "source_type": source_type
+                },
+                {"$inc": {"source_balance": delta}}
+            )
+            for (source_name, source_type), delta in balance_deltas.items()
+        ],
+        "rollup_updates": [
+            UpdateOne(dict(rollup_key), {"$inc": deltas, "$currentDate": {"updated_at": True}}, upsert=True)
+            for rollup_key, deltas in rollup_deltas.items()
+        ],
+        "checkpoint_invalidations": get_checkpoint_invalidations(movement_dicts, username)
+    }
+
+@timed()
+async def write_accept_operations(collections: dict, operations: dict, username: str, session=None):
+    # Each write is built only when it runs, so a failed write leaves no coroutine unawaited
+    writes = [
+        lambda: collections["finance"].insert_many(operations["movements"], session=session),
+        lambda: collections["sources"].bulk_write(operations["source_updates"], ordered=False, session=session),
+        lambda: collections["rollups"].bulk_write(operations["rollup_updates"], ordered=False, session=session)
+    ]
+
+    if operations["categories"]:
+        writes.append(
+            lambda: collections["categories"].update_one(
+                {"username": username},
+                {"$addToSet": {"categories": {"$each": operations["categories"]}}},
+                upsert=True,
+                session=session
+            )
+        )
+
+    # The epochs move once the movements are in and before the checkpoints go, see create_checkpoints
+    invalidations = []
+
+    if operations["checkpoint_invalidations"]:
+        invalidations.append(
+            lambda: collections["sources"].bulk_write(
+                get_checkpoint_epoch_updates(operations["checkpoint_invalidations"]),
+                ordered=False,
+                session=session
+            )
+        )
+
+    invalidations += [
+        functools.partial(collections["checkpoints"].delete_many, checkpoint_filter, session=session)
+        for checkpoint_filter in operations["checkpoint_invalidations"]
+    ]
+
+    if session is None:
+        await asyncio.gather(*(write() for write in writes))
+    else:
+        # Operations inside a transaction must run one at a time on the session
+        for write in writes:
+            await write()
+
+    for invalidation in invalidations:
+        await invalidation()
+
+@timed()
+async def accept_movements(movements: List[Movement], username: str) -> bool:
+    try:
+        database    = get_async_mongo_client(st.secrets.db_credentials.uri)[st.secrets.db_credentials.database_name]
+        operations  = get_accept_operations(movements, username)
+        collections = {
+            "finance": database[st.secrets.db_collections.finance_collection_name],
+            "sources": database[st.secrets.db_collections.sources_collection_name],
+            "rollups": database[st.secrets.db_collections.rollups_collection_name],
+            "categories": database[st.secrets.db_collections.categories_collection_name],
+            "checkpoints": database[get_collection_name("checkpoints_collection_name")]
+        }
+
+        if use_transactions():
+            async with await database.client.start_session() as session:
+                async with session.start_transaction():
+                    await write_accept_operations(collections, operations, username, session)
+        else:
+            await write_accept_operations(collections, operations, username)
+
+        mark_user_write(username)
+
+        logging.info(f"{len(operations['movements'])} movements accepted for {username}")
+
+        return True
+    except Exception as e:
+        logging.error(f"Error accepting the movements: {e}")
+        record_error()
+        return False
+
+@timed()
+async def accept_movement(movement: Movement, username: str) -> bool:
+    return await accept_movements([movement], username)
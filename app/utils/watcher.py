@@ -0,0 +1,100 @@
+import time
+import logging
+import threading
+import streamlit as st
+
+from collections import defaultdict
+from utils.database import get_mongo_client
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+WATCH_RETRY_SECONDS = 30
+WATCHED_OPERATIONS  = ["insert", "update", "replace", "delete"]
+
+class ChangeWatcher:
+    def __init__(self, uri: str, database_name: str, collection_names: list):
+        self.uri            = uri
+        self.database_name  = database_name
+        self.versions       = defaultdict(int)
+        self.global_version = 0
+        self.available      = {collection_name: False for collection_name in collection_names}
+        self.lock           = threading.Lock()
+        self.threads        = [
+            threading.Thread(target=self._watch, args=(collection_name,), name=f"finbot-watcher-{collection_name}", daemon=True)
+            for collection_name in collection_names
+        ]
+
+        for thread in self.threads:
+            thread.start()
+
+    def _watch(self, collection_name: str):
+        collection   = get_mongo_client(self.uri)[self.database_name][collection_name]
+        pipeline     = [{"$match": {"operationType": {"$in": WATCHED_OPERATIONS}}}]
+        resume_token = None
+
+        while True:
+            try:
+                with collection.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                    self.available[collection_name] = True
+
+                    logging.info(f"Watching changes on {collection_name}")
+
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self.publish((change.get("fullDocument") or {}).get("username"))
+            except Exception as e:
+                logging.error(f"Change stream on {collection_name} unavailable, retrying in {WATCH_RETRY_SECONDS}s: {e}")
+
+                # Deployments without a replica set cannot open change streams
+                self.available[collection_name] = False
+                resume_token = None
+
+                time.sleep(WATCH_RETRY_SECONDS)
+
+    def publish(self, username: str = None):
+        with self.lock:
+            if username:
+                self.versions[username] += 1
+            else:
+                # Deletes carry no document, so every user is invalidated
+                self.global_version += 1
+
+    def is_available(self) -> bool:
+        return all(self.available.values())
+
+    def get_version(self, username: str) -> int:
+        with self.lock:
+            return self.versions[username] + self.global_version
+
+_watcher      = None
+_watcher_lock = threading.Lock()
+
+def get_watcher() -> ChangeWatcher:
+    global _watcher
+
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ChangeWatcher(
+                st.secrets.db_credentials.uri,
+                st.secrets.db_credentials.database_name,
+                [
+                    st.secrets.db_collections.finance_collection_name,
+                    st.secrets.db_collections.sources_collection_name,
+                    st.secrets.db_collections.rollups_collection_name
+                ]
+            )
+
+        return _watcher
+
+def has_changed(username: str, state_key: str) -> bool:
+    watcher = get_watcher()
+
+    if not watcher.is_available():
+        return True
+
+    version = watcher.get_version(username)
+    changed = st.session_state.get(state_key) != version
+
+    st.session_state[state_key] = version
+
+    return changed